@@ -1,5 +1,8 @@
 import os
 from pathlib import Path
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,4 +20,41 @@ TEMP_DIR.mkdir(exist_ok=True)
 
 DEFAULT_TARGET_LANGUAGE = "es"
 DEFAULT_VOICE_ID = "pNInz6obpgDQGcFmaJgB"  # Adam voice (male)
-ELEVENLABS_BASE_URL = "https://api.elevenlabs.io/v1"
\ No newline at end of file
+ELEVENLABS_BASE_URL = "https://api.elevenlabs.io/v1"
+
+TRANSLATION_BATCH_SIZE = 25  # Segments per OpenAI translation request
+TRANSLATION_CONCURRENCY = 4  # Translation batches in flight at once
+SYNTHESIS_CONCURRENCY = 5  # Parallel ElevenLabs requests
+DOWNLOAD_CACHE_MAX_BYTES = 10 * 1024 ** 3  # Least recently used downloads are evicted beyond this
+TTS_CACHE_MAX_BYTES = 2 * 1024 ** 3  # Least recently used synthesized speech is evicted beyond this
+VOICE_CACHE_TTL_SECONDS = 7 * 24 * 3600  # Cloned voices are reused this long, then deleted from ElevenLabs
+
+class _ElevenLabsRetry(Retry):
+    """
+    Retry idempotent requests (urllib3's default allowed_methods) on any status in
+    status_forcelist, but POSTs only on 429. A rate-limited POST was rejected before
+    any work was done, whereas a 5xx from POST /voices/add may come after the voice
+    was already created, and re-sending it would leak a duplicate voice.
+    """
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method.upper() == "POST":
+            return status_code == 429
+        return super().is_retry(method, status_code, has_retry_after)
+
+# Rate limits (429) and transient 5xx responses are retried up to 3 times with backoff,
+# honouring Retry-After. Read errors are not retried, since the server may have acted
+# on the request. The last response is returned rather than raised, so callers still
+# see its status.
+HTTP_RETRY = _ElevenLabsRetry(
+    total=3,
+    read=0,
+    backoff_factor=0.5,
+    status_forcelist=[429, 500, 502, 503, 504],
+    raise_on_status=False
+)
+
+# One keep-alive connection pool shared by every ElevenLabs call, so segments
+# reuse connections instead of paying a TLS handshake each
+HTTP_SESSION = requests.Session()
+HTTP_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=max(2 * SYNTHESIS_CONCURRENCY, 10),
+                                           max_retries=HTTP_RETRY))
\ No newline at end of file
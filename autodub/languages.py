@@ -0,0 +1,20 @@
+from typing import Tuple
+
+# Language code -> (name used in translation prompts, ElevenLabs language code)
+LANGUAGE_MAP = {
+    'es': ('Spanish', 'es'),
+    'fr': ('French', 'fr'),
+    'de': ('German', 'de'),
+    'it': ('Italian', 'it'),
+    'pt': ('Portuguese', 'pt'),
+    'ru': ('Russian', 'ru'),
+    'ja': ('Japanese', 'ja'),
+    'ko': ('Korean', 'ko'),
+    'zh': ('Chinese', 'zh'),
+    'ar': ('Arabic', 'ar'),
+    'hi': ('Hindi', 'hi'),
+}
+
+def resolve_language(target_language: str) -> Tuple[str, str]:
+    """Return (language name, language code), passing unknown codes through as both."""
+    return LANGUAGE_MAP.get(target_language, (target_language, target_language))
@@ -1,72 +1,67 @@
 #!/usr/bin/env python3
 import argparse
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 
-from .pipeline.download import download_video
+from .languages import LANGUAGE_MAP, resolve_language
+from .pipeline.download import start_download
 from .pipeline.separate import separate_audio
 from .pipeline.transcribe import transcribe_audio
-from .pipeline.translate import translate_segments
+from .pipeline.translate import iter_translated_batches
 from .pipeline.synthesize import synthesize_segments
 from .pipeline.align import align_segments
 from .pipeline.mix_simple import mix_audio_simple
 from .pipeline.mux import mux_video
-from .config import TEMP_DIR, OUTPUT_DIR
-
-LANGUAGE_MAP = {
-    'es': ('Spanish', 'es'),
-    'fr': ('French', 'fr'),
-    'de': ('German', 'de'),
-    'it': ('Italian', 'it'),
-    'pt': ('Portuguese', 'pt'),
-    'ru': ('Russian', 'ru'),
-    'ja': ('Japanese', 'ja'),
-    'ko': ('Korean', 'ko'),
-    'zh': ('Chinese', 'zh'),
-    'ar': ('Arabic', 'ar'),
-    'hi': ('Hindi', 'hi'),
-}
+from .config import TEMP_DIR, OUTPUT_DIR, TRANSLATION_BATCH_SIZE
 
 def autodub_pipeline(
     youtube_url: str,
     target_language: str = 'es',
     output_name: Optional[str] = None,
-    preserve_background: bool = False
+    preserve_background: bool = False,
+    batch_size: int = TRANSLATION_BATCH_SIZE
 ) -> Path:
     """
     Complete autodub pipeline: download -> transcribe -> translate -> synthesize -> align -> mux
     """
+    lang_name, lang_code = resolve_language(target_language)
     print(f"\n{'='*60}")
-    print(f"AutoDub Pipeline - Dubbing to {LANGUAGE_MAP.get(target_language, (target_language, target_language))[0]}")
+    print(f"AutoDub Pipeline - Dubbing to {lang_name}")
     print(f"{'='*60}\n")
     
     try:
-        print("[Step 1/7] Downloading video and extracting audio...")
-        video_path, audio_path = download_video(youtube_url, output_name or "input")
-        
-        # Step 2: Source separation (if enabled)
-        if preserve_background:
-            print("\n[Step 2/7] Separating vocals from background...")
-            vocals_path, background_path = separate_audio(audio_path, use_separation=True)
-            audio_for_transcription = vocals_path
-        else:
-            print("\n[Step 2/7] Skipping source separation...")
-            audio_for_transcription = audio_path
-            background_path = None
+        print("[Step 1/7] Downloading audio (video continues in background)...")
+        video_download, audio_path = start_download(youtube_url, output_name or "input")
         
-        print(f"\n[Step 3/7] Transcribing audio with speaker detection...")
-        segments = transcribe_audio(audio_for_transcription)
+        # Steps 2-3: Source separation runs in a worker thread while the original
+        # audio is transcribed, so Demucs overlaps with the Deepgram round-trip
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            if preserve_background:
+                print("\n[Step 2/7] Separating vocals from background (alongside transcription)...")
+                separation = executor.submit(separate_audio, audio_path, use_separation=True)
+            else:
+                print("\n[Step 2/7] Skipping source separation...")
+                separation = None
+                background_path = None
+            
+            print(f"\n[Step 3/7] Transcribing audio with speaker detection...")
+            segments = transcribe_audio(audio_path)
+            
+            if separation is not None:
+                _, background_path = separation.result()
         
         if not segments:
             raise Exception("No speech segments detected in the video")
         
-        lang_name, lang_code = LANGUAGE_MAP.get(target_language, (target_language, target_language))
+        # Steps 4-5: each translated batch goes straight to synthesis, so TTS
+        # requests start while later batches are still being translated
         print(f"\n[Step 4/7] Translating {len(segments)} segments to {lang_name}...")
-        segments = translate_segments(segments, lang_name)
+        translated_batches = iter_translated_batches(segments, lang_name, batch_size=batch_size)
         
-        print(f"\n[Step 5/7] Synthesizing speech in {lang_name}...")
-        segments = synthesize_segments(segments, lang_code)
+        print(f"\n[Step 5/7] Synthesizing speech in {lang_name} as translations arrive...")
+        segments = synthesize_segments(segments, lang_code, ready=translated_batches)
         
         print("\n[Step 6/7] Aligning dubbed audio to original timing...")
         dubbed_audio_path = align_segments(segments)
@@ -79,7 +74,7 @@ def autodub_pipeline(
             final_audio_path = dubbed_audio_path
             
         print("\n[Step 7b/7] Creating final dubbed video...")
-        output_path = mux_video(video_path, final_audio_path, output_name or "output")
+        output_path = mux_video(video_download.result(), final_audio_path, output_name or "output")
         
         print(f"\n{'='*60}")
         print(f"✅ Success! Dubbed video created at:")
@@ -126,11 +121,17 @@ Supported languages:
         action='store_true',
         help='Preserve original background music and effects'
     )
+    parser.add_argument(
+        '--batch-size', '-b',
+        type=int,
+        default=TRANSLATION_BATCH_SIZE,
+        help=f'Segments per translation request (default: {TRANSLATION_BATCH_SIZE})'
+    )
     
     args = parser.parse_args()
     
     try:
-        autodub_pipeline(args.url, args.lang, args.output, args.preserve_background)
+        autodub_pipeline(args.url, args.lang, args.output, args.preserve_background, args.batch_size)
     except KeyboardInterrupt:
         print("\n\nInterrupted by user", file=sys.stderr)
         sys.exit(1)
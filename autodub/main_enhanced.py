@@ -1,13 +1,16 @@
 #!/usr/bin/env python3
 import argparse
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 
-from .pipeline.download import download_video
+from .languages import LANGUAGE_MAP, resolve_language
+from .pipeline.download import start_download
 from .pipeline.separate import separate_audio
 from .pipeline.transcribe import transcribe_audio
 from .pipeline.speaker_profile import build_speaker_profiles
+from .pipeline._segments import segment_table, speaker_ids
 from .pipeline.voice_mapper import assign_unique_voices
 from .pipeline.voice_clone import clone_speaker_voices, cleanup_cloned_voices
 from .pipeline.translate import translate_segments
@@ -15,21 +18,7 @@ from .pipeline.synthesize_enhanced import synthesize_segments_enhanced, validate
 from .pipeline.align_simple import align_segments_simple
 from .pipeline.mix_simple import mix_audio_simple
 from .pipeline.mux import mux_video
-from .config import TEMP_DIR, OUTPUT_DIR
-
-LANGUAGE_MAP = {
-    'es': ('Spanish', 'es'),
-    'fr': ('French', 'fr'),
-    'de': ('German', 'de'),
-    'it': ('Italian', 'it'),
-    'pt': ('Portuguese', 'pt'),
-    'ru': ('Russian', 'ru'),
-    'ja': ('Japanese', 'ja'),
-    'ko': ('Korean', 'ko'),
-    'zh': ('Chinese', 'zh'),
-    'ar': ('Arabic', 'ar'),
-    'hi': ('Hindi', 'hi'),
-}
+from .config import TEMP_DIR, OUTPUT_DIR, TRANSLATION_BATCH_SIZE, DEFAULT_VOICE_ID
 
 def enhanced_autodub_pipeline(
     youtube_url: str,
@@ -37,7 +26,8 @@ def enhanced_autodub_pipeline(
     output_name: Optional[str] = None,
     preserve_background: bool = True,
     diverse_voices: bool = True,
-    voice_clone: bool = False
+    voice_clone: bool = False,
+    batch_size: int = TRANSLATION_BATCH_SIZE
 ) -> Path:
     """
     Enhanced AutoDub pipeline with multi-speaker voice assignment and background preservation.
@@ -48,10 +38,13 @@ def enhanced_autodub_pipeline(
         output_name: Output filename (without extension)
         preserve_background: Whether to preserve background audio
         diverse_voices: Whether to use different voices for different speakers
+        voice_clone: Whether to enable voice cloning
+        batch_size: Number of segments sent per translation request
     """
+    lang_name, lang_code = resolve_language(target_language)
     print(f"\n{'='*70}")
     print(f"🎬 Enhanced AutoDub Pipeline - Multi-Speaker Dubbing")
-    print(f"🎯 Target: {LANGUAGE_MAP.get(target_language, (target_language, target_language))[0]}")
+    print(f"🎯 Target: {lang_name}")
     print(f"🎵 Background: {'Preserved' if preserve_background else 'Not preserved'}")
     print(f"🎭 Voice diversity: {'Enabled' if diverse_voices else 'Disabled'}")
     print(f"🧬 Voice cloning: {'Enabled' if voice_clone else 'Disabled'}")
@@ -59,40 +52,57 @@ def enhanced_autodub_pipeline(
     
     try:
         # Step 1: Download
-        print("📥 [Step 1/9] Downloading video and extracting audio...")
-        video_path, audio_path = download_video(youtube_url, output_name or "enhanced_input")
-        
-        # Step 2: Transcription FIRST (before separation to preserve speaker info)
-        print(f"\n🎙️ [Step 2/9] Transcribing with speaker diarization...")
-        segments = transcribe_audio(audio_path)  # Always use original audio for transcription
+        print("📥 [Step 1/9] Downloading audio (video continues in background)...")
+        video_download, audio_path = start_download(youtube_url, output_name or "enhanced_input")
         
-        # Step 3: Source separation (after transcription)
-        if preserve_background:
-            print("\n🎵 [Step 3/9] Separating vocals from background...")
-            vocals_path, background_path = separate_audio(audio_path, use_separation=True)
-        else:
-            print("\n⏭️ [Step 3/9] Skipping source separation...")
-            vocals_path = None
-            background_path = None
+        # Steps 2-3: Transcription (on the original audio, to preserve speaker info)
+        # overlaps with source separation running in a worker thread
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            print(f"\n🎙️ [Step 2/9] Transcribing with speaker diarization...")
+            if preserve_background:
+                print("🎵 [Step 3/9] Separating vocals from background (alongside transcription)...")
+                separation = executor.submit(separate_audio, audio_path, use_separation=True)
+            else:
+                print("⏭️ [Step 3/9] Skipping source separation...")
+                separation = None
+                vocals_path = None
+                background_path = None
+            
+            segments = transcribe_audio(audio_path)  # Always use original audio for transcription
+            
+            if separation is not None:
+                vocals_path, background_path = separation.result()
         
         if not segments:
             raise Exception("No speech segments detected in the video")
         
         # Check if multi-speaker content detected
-        unique_speakers = set(segment['speaker'] for segment in segments)
+        # Indexed by speaker once, for cloning and profiling to share
+        speaker_table = segment_table(segments)
+        unique_speakers = speaker_ids(speaker_table)
         print(f"🗣️ Detected {len(unique_speakers)} unique speaker(s): {sorted(unique_speakers)}")
         
-        # Step 4: Voice cloning (if enabled)
-        cloned_voices = {}
-        if voice_clone:
-            print(f"\n🧬 [Step 4/9] Voice cloning...")
-            cloned_voices = clone_speaker_voices(segments, audio_path, use_cloning=True)
+        # Steps 4-5: speaker profiling (local analysis) overlaps with voice cloning (ElevenLabs uploads)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            if voice_clone:
+                print(f"\n🧬 [Step 4/9] Voice cloning...")
+            
+            profiling = None
+            if diverse_voices and len(unique_speakers) > 1:
+                print(f"\n👥 [Step 5/9] Building speaker profiles (alongside voice cloning)...")
+                profiling = executor.submit(build_speaker_profiles, segments,
+                                            vocals_path if preserve_background else audio_path, table=speaker_table)
+            
+            # Step 4: Voice cloning (if enabled)
+            cloned_voices = {}
+            if voice_clone:
+                cloned_voices = clone_speaker_voices(segments, audio_path, use_cloning=True, table=speaker_table)
+            
+            if profiling is not None:
+                speaker_profiles = profiling.result()
         
         # Step 5: Speaker analysis and voice assignment
-        if diverse_voices and len(unique_speakers) > 1:
-            print(f"\n👥 [Step 5/9] Building speaker profiles...")
-            speaker_profiles = build_speaker_profiles(segments, vocals_path if preserve_background else audio_path)
-            
+        if profiling is not None:
             print(f"\n🎭 [Step 6/9] Assigning unique voices...")
             voice_assignments = assign_unique_voices(speaker_profiles)
             
@@ -114,7 +124,6 @@ def enhanced_autodub_pipeline(
                 
             speaker_profiles = {}
             # Use cloned voices if available, otherwise default
-            from .config import DEFAULT_VOICE_ID
             voice_assignments = {}
             for speaker in unique_speakers:
                 if speaker in cloned_voices and cloned_voices[speaker] is not None:
@@ -124,9 +133,8 @@ def enhanced_autodub_pipeline(
                     voice_assignments[speaker] = DEFAULT_VOICE_ID
         
         # Step 7: Translation
-        lang_name, lang_code = LANGUAGE_MAP.get(target_language, (target_language, target_language))
         print(f"\n🌍 [Step 7/9] Translating {len(segments)} segments to {lang_name}...")
-        segments = translate_segments(segments, lang_name)
+        segments = translate_segments(segments, lang_name, batch_size=batch_size)
         
         # Step 8: Enhanced synthesis
         print(f"\n🗣️ [Step 8/9] Multi-speaker synthesis...")
@@ -148,7 +156,7 @@ def enhanced_autodub_pipeline(
             final_audio_path = dubbed_audio_path
         
         print("🎬 [Step 9c/9] Creating final dubbed video...")
-        output_path = mux_video(video_path, final_audio_path, output_name or "enhanced_output")
+        output_path = mux_video(video_download.result(), final_audio_path, output_name or "enhanced_output")
         
         # Cleanup cloned voices
         if cloned_voices:
@@ -233,6 +241,12 @@ Supported languages:
         default=False,
         help='Enable voice cloning using ElevenLabs (requires Pro plan)'
     )
+    parser.add_argument(
+        '--batch-size', '-b',
+        type=int,
+        default=TRANSLATION_BATCH_SIZE,
+        help=f'Segments per translation request (default: {TRANSLATION_BATCH_SIZE})'
+    )
     
     args = parser.parse_args()
     
@@ -243,7 +257,8 @@ Supported languages:
             args.output,
             args.preserve_background,
             args.diverse_voices,
-            args.voice_clone
+            args.voice_clone,
+            args.batch_size
         )
     except KeyboardInterrupt:
         print("\n\nInterrupted by user", file=sys.stderr)
@@ -0,0 +1,275 @@
+"""
+Disk-backed cache for downloads, translations, synthesized speech, speaker
+profiles and cloned voices.
+Entries persist under TEMP_DIR across runs, so re-dubbing a video (or any
+repeated line) skips the OpenAI/ElevenLabs round-trip.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from ..config import TEMP_DIR, DOWNLOAD_CACHE_MAX_BYTES, TTS_CACHE_MAX_BYTES, VOICE_CACHE_TTL_SECONDS
+
+TRANSLATION_CACHE_DIR = TEMP_DIR / "cache" / "translations"
+TTS_CACHE_DIR = TEMP_DIR / "cache" / "tts"
+PROFILE_CACHE_DIR = TEMP_DIR / "cache" / "profiles"
+DOWNLOAD_CACHE_DIR = TEMP_DIR / "cache" / "downloads"
+DOWNLOAD_CACHE_INDEX = DOWNLOAD_CACHE_DIR / "cache_index.json"
+VOICE_CACHE_INDEX = TEMP_DIR / "cache" / "voices.json"
+
+TRANSLATION_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+TTS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+PROFILE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+DOWNLOAD_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+PROFILE_KEY_PREFIX_BYTES = 1 << 20  # Audio bytes hashed into a speaker profile key
+
+def cache_key(*parts: str) -> str:
+    """Stable key for a tuple of strings."""
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+def _atomic_write(path: Path, data: bytes):
+    # Write to a sibling temp file and rename, so concurrent readers never see partial entries
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def get_cached_translation(text: str, target_language: str) -> Optional[str]:
+    path = TRANSLATION_CACHE_DIR / f"{cache_key(text, target_language)}.txt"
+    try:
+        return path.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+
+def cache_translation(text: str, target_language: str, translated: str):
+    path = TRANSLATION_CACHE_DIR / f"{cache_key(text, target_language)}.txt"
+    _atomic_write(path, translated.encode("utf-8"))
+
+def _speech_path(voice_id: str, request: Dict, language_code: str, output_format: str) -> Path:
+    # request is the whole TTS body (text, model_id, voice_settings), so any change to it is a new entry
+    body = json.dumps(request, sort_keys=True)
+    return TTS_CACHE_DIR / f"{cache_key(voice_id, body, language_code, output_format)}.mp3"
+
+# Running size of the speech cache in this process, counted once and then kept up to date
+_speech_cache_bytes: Optional[int] = None
+_speech_cache_lock = threading.Lock()
+
+def _evict_speech(keep: Path) -> int:
+    # Drop least recently used entries (by mtime, which hits refresh) until the cache is
+    # back under 90% of TTS_CACHE_MAX_BYTES, never evicting keep. Returns the new size.
+    entries = []
+    for entry in os.scandir(TTS_CACHE_DIR):
+        if entry.name.endswith('.mp3'):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, Path(entry.path)))
+    
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= TTS_CACHE_MAX_BYTES * 0.9:
+            break
+        if path == keep:
+            continue
+        path.unlink(missing_ok=True)
+        total -= size
+    return total
+
+def get_cached_speech(voice_id: str, request: Dict, language_code: str, output_format: str) -> Optional[Path]:
+    path = _speech_path(voice_id, request, language_code, output_format)
+    try:
+        os.utime(path)  # Mark as recently used
+    except FileNotFoundError:
+        return None
+    return path
+
+def cache_speech(audio_path: Path, voice_id: str, request: Dict, language_code: str, output_format: str):
+    global _speech_cache_bytes
+    path = _speech_path(voice_id, request, language_code, output_format)
+    _atomic_write(path, audio_path.read_bytes())
+    
+    with _speech_cache_lock:
+        if _speech_cache_bytes is None:
+            _speech_cache_bytes = _evict_speech(keep=path)
+        else:
+            _speech_cache_bytes += path.stat().st_size
+            if _speech_cache_bytes > TTS_CACHE_MAX_BYTES:
+                _speech_cache_bytes = _evict_speech(keep=path)
+
+def profile_key(audio_path: Path, segments: List[Dict], analysis_params: Tuple) -> str:
+    """
+    Key speaker profiles on the audio (its size and first megabyte), the
+    diarized segment boundaries and the parameters of the analysis that
+    produced them, so re-dubbing a video reuses its profiles but a change to
+    the analysis doesn't serve stale ones.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(list(analysis_params)).encode())
+    with open(audio_path, 'rb') as f:
+        digest.update(f.read(PROFILE_KEY_PREFIX_BYTES))
+    digest.update(str(audio_path.stat().st_size).encode())
+    boundaries = [(s['speaker'], s['start'], s['end']) for s in segments]
+    digest.update(json.dumps(boundaries).encode())
+    return digest.hexdigest()
+
+def get_cached_profiles(key: str) -> Optional[Dict[int, Dict]]:
+    path = PROFILE_CACHE_DIR / f"{key}.json"
+    try:
+        profiles = json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    # JSON object keys are strings; speaker IDs are ints everywhere else
+    return {int(speaker_id): profile for speaker_id, profile in profiles.items()}
+
+def cache_profiles(key: str, profiles: Dict[int, Dict]):
+    path = PROFILE_CACHE_DIR / f"{key}.json"
+    # default=float turns numpy scalars from librosa into plain floats
+    _atomic_write(path, json.dumps(profiles, default=float).encode("utf-8"))
+
+# Guards the download index, which the background video download also updates
+_download_index_lock = threading.Lock()
+
+def _download_path(url: str, suffix: str) -> Path:
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+    return DOWNLOAD_CACHE_DIR / f"{key}{suffix}"
+
+def _load_download_index() -> Dict[str, Dict]:
+    try:
+        return json.loads(DOWNLOAD_CACHE_INDEX.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _touch_download(index: Dict[str, Dict], path: Path, url: str):
+    index[path.name] = {"url": url, "last_used": time.time()}
+
+def _evict_downloads(index: Dict[str, Dict], keep: str):
+    # Drop least recently used files until the cache fits DOWNLOAD_CACHE_MAX_BYTES,
+    # never evicting keep (the file that was just added)
+    sizes = {name: (DOWNLOAD_CACHE_DIR / name).stat().st_size
+             for name in list(index) if (DOWNLOAD_CACHE_DIR / name).exists()}
+    for name in set(index) - set(sizes):
+        del index[name]
+    
+    total = sum(sizes.values())
+    for name in sorted(sizes, key=lambda name: index[name]["last_used"]):
+        if total <= DOWNLOAD_CACHE_MAX_BYTES:
+            break
+        if name == keep:
+            continue
+        (DOWNLOAD_CACHE_DIR / name).unlink(missing_ok=True)
+        total -= sizes[name]
+        del index[name]
+
+def get_cached_download(url: str) -> Optional[Tuple[Path, Path]]:
+    """Return (video_path, audio_path) if both were cached for url."""
+    video_path = _download_path(url, ".mp4")
+    audio_path = _download_path(url, ".wav")
+    if not all(path.exists() and path.stat().st_size > 0 for path in (video_path, audio_path)):
+        return None
+    
+    with _download_index_lock:
+        index = _load_download_index()
+        _touch_download(index, video_path, url)
+        _touch_download(index, audio_path, url)
+        _atomic_write(DOWNLOAD_CACHE_INDEX, json.dumps(index).encode("utf-8"))
+    
+    return video_path, audio_path
+
+def cache_download_file(url: str, path: Path) -> Path:
+    """
+    Move a freshly downloaded file into the download cache, keyed by url and
+    the file's suffix, and return its new location.
+    """
+    cached_path = _download_path(url, path.suffix)
+    os.replace(path, cached_path)
+    
+    with _download_index_lock:
+        index = _load_download_index()
+        _touch_download(index, cached_path, url)
+        _evict_downloads(index, keep=cached_path.name)
+        _atomic_write(DOWNLOAD_CACHE_INDEX, json.dumps(index).encode("utf-8"))
+    
+    return cached_path
+
+VOICE_CACHE_LOCK = TEMP_DIR / "cache" / "voices.lock"
+
+@contextmanager
+def _voice_index_locked():
+    # An flock on a sidecar file, so job worker processes (and the threads cloning
+    # speakers in each) take turns reading, changing and replacing the index
+    with open(VOICE_CACHE_LOCK, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def voice_sample_key(sample_path: Path) -> str:
+    """Key a cloned voice on its reference sample (a WAV, so the sample rate is hashed too)."""
+    return hashlib.sha256(sample_path.read_bytes()).hexdigest()
+
+def _load_voice_index() -> Dict[str, Dict]:
+    try:
+        return json.loads(VOICE_CACHE_INDEX.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _save_voice_index(index: Dict[str, Dict]):
+    _atomic_write(VOICE_CACHE_INDEX, json.dumps(index).encode("utf-8"))
+
+def take_cached_voice(key: str) -> Optional[str]:
+    """
+    The cached voice_id for key, if any. Taking a voice renews its expiry, so
+    it can't be expired and deleted while the job that took it still uses it.
+    """
+    with _voice_index_locked():
+        index = _load_voice_index()
+        entry = index.get(key)
+        if entry is None or entry["expires"] <= time.time():
+            return None
+        entry["expires"] = time.time() + VOICE_CACHE_TTL_SECONDS
+        _save_voice_index(index)
+    return entry["voice_id"]
+
+def cache_voice(key: str, voice_id: str):
+    with _voice_index_locked():
+        index = _load_voice_index()
+        index[key] = {"voice_id": voice_id, "expires": time.time() + VOICE_CACHE_TTL_SECONDS}
+        _save_voice_index(index)
+
+def drop_cached_voice(key: str):
+    """Forget a cached voice (e.g. one deleted on ElevenLabs since it was cached)."""
+    with _voice_index_locked():
+        index = _load_voice_index()
+        if index.pop(key, None) is not None:
+            _save_voice_index(index)
+
+def cached_voice_ids() -> Set[str]:
+    """voice_ids that are still cached, which must outlive the job that cloned them."""
+    now = time.time()
+    return {entry["voice_id"] for entry in _load_voice_index().values() if entry["expires"] > now}
+
+def pop_expired_voices() -> List[str]:
+    """Remove expired voices from the index and return their voice_ids, for deletion."""
+    with _voice_index_locked():
+        index = _load_voice_index()
+        now = time.time()
+        expired = [key for key, entry in index.items() if entry["expires"] <= now]
+        if not expired:
+            return []
+        voice_ids = [index.pop(key)["voice_id"] for key in expired]
+        _save_voice_index(index)
+    return voice_ids
@@ -0,0 +1,53 @@
+"""
+Shared ffmpeg helpers for cutting speaker audio out of a longer track.
+"""
+
+import subprocess
+from pathlib import Path
+from typing import List, Tuple
+import numpy as np
+
+EXTRACT_MAX_INPUTS = 64  # Ranges opened as separate seeked inputs, well under open-file limits
+
+def _ranges_command(source_path: Path, ranges: List[Tuple[float, float]], sample_rate: int) -> List[str]:
+    """
+    ffmpeg arguments (everything but the output) that cut the (start, end)
+    ranges in seconds out of source_path and concatenate them, in order, as
+    mono audio at sample_rate, with a single graph.
+    Up to EXTRACT_MAX_INPUTS ranges are each opened as an input seeked to its
+    start, so only the kept audio is decoded; longer lists decode the source
+    once and cut it with atrim.
+    """
+    cmd = ['ffmpeg', '-nostdin', '-loglevel', 'error', '-nostats']
+
+    if len(ranges) <= EXTRACT_MAX_INPUTS:
+        for start, end in ranges:
+            cmd += ['-ss', str(start), '-t', str(end - start), '-i', str(source_path)]
+        inputs = ''.join(f"[{k}:a]" for k in range(len(ranges)))
+        filters = []
+    else:
+        cmd += ['-i', str(source_path)]
+        filters = [f"[0:a]atrim=start={start}:end={end},asetpts=PTS-STARTPTS[a{k}]"
+                   for k, (start, end) in enumerate(ranges)]
+        inputs = ''.join(f"[a{k}]" for k in range(len(ranges)))
+    filters.append(f"{inputs}concat=n={len(ranges)}:v=0:a=1[out]")
+
+    return cmd + [
+        '-filter_complex', ';'.join(filters),
+        '-map', '[out]',
+        '-ar', str(sample_rate), '-ac', '1'
+    ]
+
+def extract_ranges(source_path: Path, ranges: List[Tuple[float, float]], output_path: Path, sample_rate: int):
+    """Write the concatenated ranges of source_path to a mono WAV at sample_rate."""
+    cmd = _ranges_command(source_path, ranges, sample_rate) + ['-y', str(output_path)]
+    subprocess.run(cmd, capture_output=True, check=True)
+
+def read_ranges(source_path: Path, ranges: List[Tuple[float, float]], sample_rate: int) -> np.ndarray:
+    """
+    Return the concatenated ranges of source_path as mono float32 samples at
+    sample_rate, read from ffmpeg's stdout with no intermediate file.
+    """
+    cmd = _ranges_command(source_path, ranges, sample_rate) + ['-f', 'f32le', 'pipe:1']
+    result = subprocess.run(cmd, capture_output=True, check=True)
+    return np.frombuffer(result.stdout, dtype=np.float32)
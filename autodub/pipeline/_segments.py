@@ -0,0 +1,38 @@
+"""
+Columnar view of transcript segments for per-speaker numeric queries.
+The segment dicts still carry text and audio paths; this table only holds
+the timing fields, grouped by speaker, so filters and sums run in NumPy.
+"""
+
+from typing import Dict, List, Tuple
+import numpy as np
+
+SEGMENT_DTYPE = np.dtype([
+    ('start', 'f8'),
+    ('end', 'f8'),
+    ('speaker', 'i4'),
+    ('confidence', 'f4'),
+    ('index', 'i4'),  # Position in the original segments list
+])
+
+def segment_table(segments: List[Dict]) -> np.ndarray:
+    """
+    Structured array of segment timings, sorted by speaker. Segments of the
+    same speaker keep their original (timeline) order.
+    """
+    table = np.array(
+        [(s['start'], s['end'], s['speaker'], s.get('confidence', 0.0), i) for i, s in enumerate(segments)],
+        dtype=SEGMENT_DTYPE
+    )
+    return table[np.argsort(table['speaker'], kind='stable')]
+
+def speaker_ids(table: np.ndarray) -> List[int]:
+    return np.unique(table['speaker']).tolist()
+
+def speaker_rows(table: np.ndarray, speaker_id: int) -> np.ndarray:
+    """The rows of one speaker, found by binary search on the sorted table."""
+    lo, hi = np.searchsorted(table['speaker'], [speaker_id, speaker_id + 1])
+    return table[lo:hi]
+
+def time_ranges(rows: np.ndarray) -> List[Tuple[float, float]]:
+    return list(zip(rows['start'].tolist(), rows['end'].tolist()))
@@ -1,82 +1,128 @@
-import subprocess
+import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
+import librosa
+import numpy as np
+import soundfile as sf
 from pydub import AudioSegment
-from pydub.silence import detect_nonsilent
 from ..config import TEMP_DIR
 
+SAMPLE_RATE = 44100  # Output rate of the aligned track (mono, 16-bit)
+
 def get_audio_duration(audio_path: Path) -> float:
-    """Get duration of audio file in seconds."""
-    audio = AudioSegment.from_file(audio_path)
-    return len(audio) / 1000.0
+    """
+    Get duration of audio file in seconds.
+    Read from the file header when libsndfile knows the format, so no samples
+    are decoded; anything else is decoded with pydub.
+    """
+    try:
+        return sf.info(str(audio_path)).duration
+    except Exception:
+        audio = AudioSegment.from_file(audio_path)
+        return len(audio) / 1000.0
 
-def adjust_audio_speed(input_path: Path, output_path: Path, speed_factor: float):
-    """Adjust audio speed using ffmpeg atempo filter."""
-    if speed_factor < 0.5:
-        speed_factor = 0.5
-    elif speed_factor > 2.0:
-        speed_factor = 2.0
-    
-    cmd = [
-        'ffmpeg', '-i', str(input_path),
-        '-filter:a', f'atempo={speed_factor}',
-        '-y', str(output_path)
-    ]
+def time_stretch(samples: np.ndarray, rate: float) -> np.ndarray:
+    """
+    Time-stretch 16-bit samples in-process with a phase vocoder.
+    rate > 1.0 speeds up (shortens), < 1.0 slows down (lengthens).
+    """
+    stretched = librosa.effects.time_stretch(samples.astype(np.float32) / 32768.0, rate=rate)
+    return (np.clip(stretched, -1.0, 1.0) * 32767).astype(np.int16)
+
+def decode_to_samples(audio_path: Path) -> np.ndarray:
+    """
+    Decode an audio file to mono 16-bit samples at SAMPLE_RATE.
+    libsndfile decodes in-process (WAV, and the 44.1 kHz MP3s ElevenLabs
+    returns); other formats or rates go through pydub/ffmpeg.
+    """
+    try:
+        samples, sample_rate = sf.read(str(audio_path), dtype='int16', always_2d=True)
+        if sample_rate == SAMPLE_RATE:
+            if samples.shape[1] == 1:
+                return samples[:, 0]
+            return samples.mean(axis=1).astype(np.int16)
+    except Exception:
+        pass
     
-    subprocess.run(cmd, capture_output=True, check=True)
+    audio = AudioSegment.from_file(audio_path).set_frame_rate(SAMPLE_RATE).set_channels(1).set_sample_width(2)
+    return np.frombuffer(audio.raw_data, dtype=np.int16)
+
+def _decode_segment(segment: Dict) -> Optional[np.ndarray]:
+    if not segment.get('audio_path') or not segment['audio_path'].exists():
+        return None
+    return decode_to_samples(segment['audio_path'])
+
+def _stretch_segment(i: int, audio: np.ndarray, speed_factor: float, target_length: int) -> np.ndarray:
+    try:
+        samples = time_stretch(audio, speed_factor)
+        print(f"Adjusted speed of segment {i} by factor {speed_factor:.2f}")
+        return samples
+    except Exception as e:
+        print(f"Failed to adjust segment {i}: {e}")
+        return audio[:target_length]
 
 def align_segments(segments: List[Dict]) -> Path:
     """
     Align synthesized audio segments to original timing.
     Creates a single continuous audio track.
+    Each segment is placed at its own start time; where segments overlap, the
+    later one takes over.
     """
     print("Aligning audio segments...")
     
-    combined = AudioSegment.silent(duration=0)
-    last_end_time = 0
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        decoded = list(executor.map(_decode_segment, segments))
+        present = [i for i, audio in enumerate(decoded) if audio is not None]
+        fitted = [decoded[i] for i in present]
+        
+        # Plan every segment at once: segments within 20% of their slot are
+        # placed as-is, up to 2x off are time-stretched, the rest are truncated
+        starts = np.array([int(segments[i]['start'] * SAMPLE_RATE) for i in present], dtype=np.int64)
+        ends = np.array([int(segments[i]['end'] * SAMPLE_RATE) for i in present], dtype=np.int64)
+        targets = np.maximum(ends - starts, 1)
+        speed_factors = np.array([len(audio) for audio in fitted], dtype=np.float64) / targets
+        
+        passthrough = (speed_factors >= 0.8) & (speed_factors <= 1.2)
+        stretch = ~passthrough & (speed_factors >= 0.5) & (speed_factors <= 2.0)
+        truncate = ~(passthrough | stretch)
+        
+        stretch_idx = np.flatnonzero(stretch)
+        stretched = executor.map(_stretch_segment, [present[k] for k in stretch_idx],
+                                 [fitted[k] for k in stretch_idx],
+                                 speed_factors[stretch_idx], targets[stretch_idx])
+        for k, samples in zip(stretch_idx, stretched):
+            fitted[k] = samples
+    
+    for k in np.flatnonzero(truncate):
+        fitted[k] = fitted[k][:targets[k]]
     
-    for i, segment in enumerate(segments):
-        if segment.get('audio_path') and segment['audio_path'].exists():
-            audio = AudioSegment.from_file(segment['audio_path'])
-            
-            start_ms = int(segment['start'] * 1000)
-            end_ms = int(segment['end'] * 1000)
-            target_duration_ms = end_ms - start_ms
-            current_duration_ms = len(audio)
-            
-            if start_ms > last_end_time:
-                silence_duration = start_ms - last_end_time
-                combined += AudioSegment.silent(duration=silence_duration)
-            
-            speed_factor = current_duration_ms / target_duration_ms
-            
-            if 0.8 <= speed_factor <= 1.2:
-                combined += audio
-            else:
-                adjusted_path = TEMP_DIR / f"adjusted_{i:04d}.mp3"
-                adjust_speed_factor = 1.0 / speed_factor
-                
-                if 0.5 <= adjust_speed_factor <= 2.0:
-                    try:
-                        adjust_audio_speed(segment['audio_path'], adjusted_path, adjust_speed_factor)
-                        adjusted_audio = AudioSegment.from_file(adjusted_path)
-                        combined += adjusted_audio
-                        print(f"Adjusted speed of segment {i} by factor {adjust_speed_factor:.2f}")
-                    except:
-                        combined += audio[:target_duration_ms] if len(audio) > target_duration_ms else audio
-                else:
-                    if len(audio) > target_duration_ms:
-                        combined += audio[:target_duration_ms]
-                    else:
-                        combined += audio
-                        padding = target_duration_ms - len(audio)
-                        if padding > 0:
-                            combined += AudioSegment.silent(duration=padding)
-            
-            last_end_time = start_ms + len(combined[start_ms:])
+    # Truncated segments are padded with silence up to their target duration
+    footprints = np.array([len(samples) for samples in fitted], dtype=np.int64)
+    footprints[truncate] = np.maximum(footprints[truncate], targets[truncate])
+    total_length = int((starts + footprints).max()) if present else 0
     
     output_path = TEMP_DIR / "dubbed_audio.wav"
-    combined.export(output_path, format="wav")
+    
+    if total_length == 0:
+        sf.write(output_path, np.zeros(0, dtype=np.int16), SAMPLE_RATE, subtype='PCM_16')
+        return output_path
+    
+    # The track is built in a disk-backed buffer so hour-long videos are paged
+    # by the OS instead of held in RAM. A fresh memmap file is zero-filled, so
+    # everything not covered by a segment is silence.
+    buffer_path = TEMP_DIR / "dubbed_audio.raw"
+    try:
+        combined = np.memmap(buffer_path, dtype=np.int16, mode='w+', shape=(total_length,))
+        for start, samples in zip(starts, fitted):
+            combined[start:start + len(samples)] = samples
+        combined.flush()
+        
+        sf.write(output_path, combined, SAMPLE_RATE, subtype='PCM_16')
+        del combined
+    finally:
+        buffer_path.unlink(missing_ok=True)
+    
     print(f"Aligned audio saved to: {output_path}")
     
-    return output_path
\ No newline at end of file
+    return output_path
@@ -1,91 +1,160 @@
+import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict
-from pydub import AudioSegment
+from typing import List, Dict, Tuple
+import numpy as np
+import soundfile as sf
 from ..config import TEMP_DIR
+from .align import get_audio_duration
+
+ALIGN_BATCH_SIZE = 64  # Segment inputs per ffmpeg graph, well under argv and open-file limits
+ALIGN_SAMPLE_RATE = 44100  # The aligned track is mono 16-bit at this rate
+
+def _duration_ms(i: int, audio_path: Path) -> float:
+    """Duration of a synthesized segment in ms, or NaN if it cannot be read."""
+    try:
+        return get_audio_duration(audio_path) * 1000
+    except Exception as e:
+        print(f"  Failed to place segment {i}: {e}")
+        return float('nan')
+
+def _plan_segments(segments: List[Dict], executor: ThreadPoolExecutor) -> List[Tuple[int, int, Path, float]]:
+    """
+    Work out where each synthesized segment goes and how much it must be sped up.
+    Only reading durations touches the files (in parallel); the timing math runs
+    over all segments at once.
+    Returns (index, start_ms, audio_path, speed_needed) for each segment to place.
+    """
+    present = [i for i, segment in enumerate(segments)
+               if segment.get('audio_path') and segment['audio_path'].exists()]
+    paths = [segments[i]['audio_path'] for i in present]
+    
+    current_durations_ms = np.fromiter(executor.map(_duration_ms, present, paths), dtype=np.float64, count=len(present))
+    current_durations_ms = np.floor(current_durations_ms)
+    
+    # Calculate timing
+    starts_ms = np.array([segments[i]['start'] * 1000 for i in present], dtype=np.float64).astype(np.int64)
+    ends_ms = np.array([segments[i]['end'] * 1000 for i in present], dtype=np.float64).astype(np.int64)
+    target_durations_ms = ends_ms - starts_ms
+    
+    # If audio is longer, we need to speed it up (factor > 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        speeds_needed = current_durations_ms / target_durations_ms
+    
+    empty_slot = (target_durations_ms == 0) & (current_durations_ms > 0)
+    placeable = (current_durations_ms > 0) & ~empty_slot
+    
+    for k in np.flatnonzero(empty_slot):
+        print(f"  Failed to place segment {present[k]}: zero-length slot")
+    for k in np.flatnonzero(placeable & (speeds_needed > 1.15)):
+        print(f"  Segment {present[k]}: Compressed {speeds_needed[k]:.1f}x to fit")
+    
+    return [(present[k], int(starts_ms[k]), paths[k], float(speeds_needed[k]))
+            for k in np.flatnonzero(placeable)]
+
+def _render_batch(batch: List[Tuple[int, int, Path, float]]) -> Tuple[int, np.ndarray]:
+    """
+    Render a batch of segments into one track with a single ffmpeg graph:
+    each input is sped up if it overruns (tempo_filter), delayed to its start time
+    (adelay), and the delayed streams are summed (amix without normalization,
+    so levels match overlaying onto silence).
+    The track starts at the batch's earliest segment rather than at 0, so no
+    leading silence is rendered. The PCM is read straight from ffmpeg's stdout,
+    so no intermediate file is written.
+    Returns that start time in ms and the track's samples.
+    """
+    origin_ms = min(start_ms for _, start_ms, _, _ in batch)
+    cmd = ['ffmpeg', '-nostdin', '-loglevel', 'error', '-nostats']
+    filters = []
+    
+    for k, (_, start_ms, audio_path, speed_needed) in enumerate(batch):
+        cmd += ['-i', str(audio_path)]
+        chain = [tempo_filter(speed_needed)] if speed_needed > 1.0 else []
+        chain.append(f"adelay=delays={start_ms - origin_ms}:all=1")
+        filters.append(f"[{k}:a]{','.join(chain)}[a{k}]")
+    
+    inputs = ''.join(f"[a{k}]" for k in range(len(batch)))
+    filters.append(f"{inputs}amix=inputs={len(batch)}:duration=longest:normalize=0[out]")
+    
+    cmd += [
+        '-filter_complex', ';'.join(filters),
+        '-map', '[out]',
+        '-ar', str(ALIGN_SAMPLE_RATE), '-ac', '1',
+        '-f', 's16le', 'pipe:1'
+    ]
+    
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+    return origin_ms, np.frombuffer(result.stdout, dtype=np.int16)
+
+def _mix_into(combined: np.ndarray, samples: np.ndarray, origin_ms: int):
+    """
+    Add rendered track samples that start at origin_ms into combined, clipping like
+    an overlay would. Anything past the end of combined is dropped.
+    """
+    offset = origin_ms * ALIGN_SAMPLE_RATE // 1000
+    if offset >= len(combined):
+        return
+    
+    samples = samples[:len(combined) - offset]
+    region = combined[offset:offset + len(samples)]
+    region[:] = np.clip(region.astype(np.int32) + samples, -32768, 32767)
 
 def align_segments_simple(segments: List[Dict]) -> Path:
     """
     Simple, reliable alignment that preserves timing without overlaps.
+    Segments are rendered in batches of ALIGN_BATCH_SIZE, one ffmpeg process per
+    batch, and the batch tracks are summed into a single NumPy buffer.
     """
     print("Aligning audio segments (simple method)...")
     
     if not segments:
         raise ValueError("No segments to align")
     
+    if not has_amix_normalize():
+        # Older builds reject the option, every batch would fail and the dub would be silent
+        raise RuntimeError("ffmpeg 4.4 or newer is required (amix has no normalize option)")
+    
     # Get total duration from last segment
     total_duration_ms = int(segments[-1]['end'] * 1000)
     
-    # Create base silent track
-    combined = AudioSegment.silent(duration=total_duration_ms)
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        planned = _plan_segments(segments, executor)
+        
+        batches = [planned[k:k + ALIGN_BATCH_SIZE] for k in range(0, len(planned), ALIGN_BATCH_SIZE)]
+        renders = [executor.submit(_render_batch, batch) for batch in batches]
+    
+    # Mix the batch tracks into one preallocated buffer (zeros are silence)
+    combined = np.zeros(total_duration_ms * ALIGN_SAMPLE_RATE // 1000, dtype=np.int16)
     
     placed_count = 0
     adjusted_count = 0
     
-    for i, segment in enumerate(segments):
-        if not segment.get('audio_path') or not segment['audio_path'].exists():
-            continue
-        
+    for batch, render in zip(batches, renders):
         try:
-            # Load synthesized audio
-            audio = AudioSegment.from_file(segment['audio_path'])
-            
-            # Calculate timing
-            start_ms = int(segment['start'] * 1000)
-            end_ms = int(segment['end'] * 1000)
-            target_duration_ms = end_ms - start_ms
-            current_duration_ms = len(audio)
-            
-            # Calculate how much we need to adjust
-            if current_duration_ms > 0:
-                # CORRECT calculation: if audio is longer, we need to speed it up (factor > 1)
-                speed_needed = current_duration_ms / target_duration_ms
-                
-                # Decide what to do based on speed needed
-                if speed_needed <= 1.15:  # Audio fits or needs minor speedup
-                    # Place as-is or with minor adjustment
-                    if speed_needed > 1.0:
-                        # Need to speed up audio (make it shorter)
-                        # For ffmpeg atempo: >1.0 speeds up, <1.0 slows down
-                        atempo_factor = speed_needed  # This actually speeds it up!
-                        
-                        temp_path = TEMP_DIR / f"adjusted_{i:04d}.wav"
-                        adjust_audio_simple(segment['audio_path'], temp_path, atempo_factor)
-                        adjusted_audio = AudioSegment.from_file(temp_path)
-                        
-                        # Verify it worked
-                        new_duration = len(adjusted_audio)
-                        
-                        combined = combined.overlay(adjusted_audio, position=start_ms)
-                        adjusted_count += 1
-                        temp_path.unlink()
-                    else:
-                        # Audio is shorter than target, place as-is
-                        combined = combined.overlay(audio, position=start_ms)
-                    
-                    placed_count += 1
-                    
-                else:  # Any amount of speedup needed - NO LIMITS!
-                    # Apply speed adjustment with no cap as requested
-                    atempo_factor = speed_needed  # FIXED: atempo > 1.0 speeds up
-                    
-                    temp_path = TEMP_DIR / f"adjusted_{i:04d}.wav"
-                    adjust_audio_simple(segment['audio_path'], temp_path, atempo_factor)
-                    adjusted_audio = AudioSegment.from_file(temp_path)
-                    
-                    combined = combined.overlay(adjusted_audio, position=start_ms)
-                    placed_count += 1
-                    adjusted_count += 1
-                    
-                    print(f"  Segment {i}: Compressed {speed_needed:.1f}x to fit")
-                    temp_path.unlink()
-                
+            origin_ms, samples = render.result()
+            _mix_into(combined, samples, origin_ms)
+            placed = batch
         except Exception as e:
-            print(f"  Failed to place segment {i}: {e}")
+            # One unreadable segment fails the whole graph, so retry the batch
+            # segment by segment and drop only the ones that still fail
+            print(f"  Batch render failed ({e}), placing {len(batch)} segments individually")
+            placed = []
+            for item in batch:
+                try:
+                    origin_ms, samples = _render_batch([item])
+                    _mix_into(combined, samples, origin_ms)
+                    placed.append(item)
+                except Exception as e:
+                    print(f"  Failed to place segment {item[0]}: {e}")
+        
+        placed_count += len(placed)
+        adjusted_count += sum(1 for *_, speed_needed in placed if speed_needed > 1.0)
     
     # Save the result
     output_path = TEMP_DIR / "dubbed_audio.wav"
-    combined.export(output_path, format="wav")
+    sf.write(output_path, combined, ALIGN_SAMPLE_RATE, subtype='PCM_16')
     
     print(f"Alignment completed:")
     print(f"  ✅ Placed: {placed_count} segments")
@@ -94,13 +163,41 @@ def align_segments_simple(segments: List[Dict]) -> Path:
     
     return output_path
 
-def adjust_audio_simple(input_path: Path, output_path: Path, atempo_factor: float):
+@lru_cache(maxsize=None)
+def has_rubberband() -> bool:
+    """Whether the installed ffmpeg was built with the rubberband filter (checked once)."""
+    try:
+        result = subprocess.run(['ffmpeg', '-hide_banner', '-filters'],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    except OSError:
+        return False
+    return any(line.split()[1:2] == ['rubberband'] for line in result.stdout.splitlines())
+
+@lru_cache(maxsize=None)
+def has_amix_normalize() -> bool:
+    """Whether the installed ffmpeg's amix filter accepts normalize (ffmpeg 4.4+, checked once)."""
+    try:
+        result = subprocess.run(['ffmpeg', '-hide_banner', '-h', 'filter=amix'],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    except OSError:
+        return False
+    return any(line.split()[:1] == ['normalize'] for line in result.stdout.splitlines())
+
+def tempo_filter(atempo_factor: float) -> str:
+    """
+    Filter that changes tempo by atempo_factor without changing pitch.
+    rubberband handles any ratio in a single pass; without it, atempo stages
+    are chained (each one another phase-vocoder pass).
+    """
+    if has_rubberband():
+        return f"rubberband=tempo={atempo_factor}"
+    return atempo_chain(atempo_factor)
+
+def atempo_chain(atempo_factor: float) -> str:
     """
-    Adjust audio speed using ffmpeg atempo filter with NO SPEED LIMITS.
-    atempo_factor: > 1.0 speeds up (shortens), < 1.0 slows down (lengthens)
-    Chains multiple atempo filters to achieve any speed.
+    Build an ffmpeg atempo filter chain for any speed - NO LIMITS!
+    A single atempo only accepts 0.5-2.0, so larger factors are chained.
     """
-    # Build atempo chain for any speed - NO LIMITS!
     if atempo_factor <= 0.5:
         # Very slow - chain multiple atempo filters
         filters = []
@@ -125,10 +222,4 @@ def adjust_audio_simple(input_path: Path, output_path: Path, atempo_factor: floa
         # Single atempo is enough (0.5 <= factor <= 2.0)
         filter_chain = f'atempo={atempo_factor}'
     
-    cmd = [
-        'ffmpeg', '-i', str(input_path),
-        '-filter:a', filter_chain,
-        '-y', str(output_path)
-    ]
-    
-    subprocess.run(cmd, capture_output=True, check=True)
\ No newline at end of file
+    return filter_chain
@@ -1,23 +1,20 @@
 import subprocess
-import os
+import threading
+from concurrent.futures import Future
 from pathlib import Path
 from typing import Tuple
 import yt_dlp
 from ..config import TEMP_DIR
+from ._cache import get_cached_download, cache_download_file
 
-def download_video(url: str, output_name: str = "input") -> Tuple[Path, Path]:
+def _yt_download(url: str, outtmpl: str, format_selector: str) -> Path:
     """
-    Download video from YouTube and extract audio.
-    Returns paths to video and audio files.
+    Download a single format with yt-dlp, retrying with a permissive format on failure.
+    Returns the path of the downloaded file.
     """
-    video_path = TEMP_DIR / f"{output_name}.mp4"
-    audio_path = TEMP_DIR / f"{output_name}.wav"
-    
-    print(f"Downloading video from: {url}")
-    
     ydl_opts = {
-        'format': 'best[height<=1080]/best',
-        'outtmpl': str(video_path),
+        'format': format_selector,
+        'outtmpl': outtmpl,
         'quiet': False,
         'no_warnings': False,
         'extractor_args': {
@@ -30,18 +27,19 @@ def download_video(url: str, output_name: str = "input") -> Tuple[Path, Path]:
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
     }
-    
+
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             info = ydl.extract_info(url, download=True)
             print(f"Downloaded: {info.get('title', 'Unknown')}")
+            return Path(ydl.prepare_filename(info))
     except Exception as e:
         print(f"Download failed: {e}")
         print("Trying alternative format selection...")
         # Fallback with more permissive format selection
         fallback_opts = {
             'format': 'best',
-            'outtmpl': str(video_path),
+            'outtmpl': outtmpl,
             'quiet': False,
             'no_warnings': False,
         }
@@ -49,21 +47,87 @@ def download_video(url: str, output_name: str = "input") -> Tuple[Path, Path]:
             with yt_dlp.YoutubeDL(fallback_opts) as ydl:
                 info = ydl.extract_info(url, download=True)
                 print(f"Downloaded (fallback): {info.get('title', 'Unknown')}")
+                return Path(ydl.prepare_filename(info))
         except Exception as e2:
             print(f"Fallback download also failed: {e2}")
             raise Exception(f"Failed to download video from {url}. The video may be private, age-restricted, or region-locked. Error: {e}")
-    
-    print("Extracting audio...")
+
+def _extract_audio(source_path: Path, audio_path: Path):
+    """Decode the audio track of source_path to 44.1 kHz stereo WAV."""
     cmd = [
-        'ffmpeg', '-i', str(video_path),
+        'ffmpeg', '-nostdin', '-loglevel', 'error', '-nostats',
+        '-i', str(source_path),
         '-vn', '-ar', '44100', '-ac', '2',
         '-f', 'wav', str(audio_path),
         '-y'
     ]
-    
-    result = subprocess.run(cmd, capture_output=True, text=True)
+
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
     if result.returncode != 0:
         raise Exception(f"FFmpeg error: {result.stderr}")
+
+def _run_in_background(fn, *args) -> Future:
+    # Daemon thread, so an abandoned download never keeps the process alive
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+# The original soundtrack is downloaded separately and replaced when muxing,
+# so prefer a video-only stream and skip downloading the audio twice
+VIDEO_FORMAT = 'bestvideo[height<=1080][ext=mp4]/bestvideo[height<=1080]/best[height<=1080]/best'
+
+def _download_video(url: str, video_path: Path) -> Path:
+    return cache_download_file(url, _yt_download(url, str(video_path), VIDEO_FORMAT))
+
+def start_download(url: str, output_name: str = "input") -> Tuple[Future, Path]:
+    """
+    Download audio from YouTube and extract it, while the video keeps downloading
+    in the background. Only muxing needs the video, so the rest of the pipeline
+    can start as soon as this returns.
+    Both files are cached by URL, so processing the same video again skips the download.
+    Returns a future resolving to the video path, and the path to the audio file.
+    """
+    cached = get_cached_download(url)
+    if cached:
+        video_path, audio_path = cached
+        print(f"Using cached download for: {url}")
+        video_download = Future()
+        video_download.set_result(video_path)
+        return video_download, audio_path
     
+    video_path = TEMP_DIR / f"{output_name}.mp4"
+    audio_path = TEMP_DIR / f"{output_name}.wav"
+
+    print(f"Downloading video from: {url}")
+    video_download = _run_in_background(_download_video, url, video_path)
+
+    try:
+        source_path = _yt_download(url, str(TEMP_DIR / f"{output_name}_audio.%(ext)s"), 'bestaudio/best')
+    except Exception as e:
+        # The background video is usually video-only, so fetch a muxed format for its audio
+        print(f"Audio-only download failed ({e}), extracting audio from a muxed download instead")
+        source_path = _yt_download(url, str(TEMP_DIR / f"{output_name}_muxed.%(ext)s"), 'best')
+
+    print("Extracting audio...")
+    _extract_audio(source_path, audio_path)
+    if source_path.exists():
+        source_path.unlink()
+
+    audio_path = cache_download_file(url, audio_path)
     print(f"Audio extracted to: {audio_path}")
-    return video_path, audio_path
\ No newline at end of file
+    return video_download, audio_path
+
+def download_video(url: str, output_name: str = "input") -> Tuple[Path, Path]:
+    """
+    Download video from YouTube and extract audio.
+    Returns paths to video and audio files.
+    """
+    video_download, audio_path = start_download(url, output_name)
+    return video_download.result(), audio_path
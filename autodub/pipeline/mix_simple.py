@@ -1,39 +1,103 @@
 import subprocess
 from pathlib import Path
+import numpy as np
+import soundfile as sf
 from ..config import TEMP_DIR
 
-def mix_audio_simple(dubbed_vocals_path: Path, background_path: Path) -> Path:
+BACKGROUND_GAIN = 0.7
+MIX_BLOCK_FRAMES = 1 << 16  # Frames mixed and piped to the encoder at a time
+
+def _mix_blocks(vocals: sf.SoundFile, background: sf.SoundFile, channels: int):
     """
-    Simple mixing of dubbed vocals with background using FFmpeg.
-    
-    Args:
-        dubbed_vocals_path: Path to dubbed vocals
-        background_path: Path to background audio
-        
-    Returns:
-        Path to mixed audio file
+    Yield the mix as float32 (frames x channels) blocks, reading both tracks a
+    block at a time. Like amix, the sum is divided by the number of tracks
+    still playing, so the tail of the longer track keeps its level.
     """
-    print("Mixing dubbed vocals with background...")
-    
-    mixed_path = TEMP_DIR / "mixed_final.wav"
+    while True:
+        v = vocals.read(MIX_BLOCK_FRAMES, dtype='float32', always_2d=True)
+        bg = background.read(MIX_BLOCK_FRAMES, dtype='float32', always_2d=True)
+        frames = max(len(v), len(bg))
+        if frames == 0:
+            return
+        
+        mixed = np.zeros((frames, channels), dtype=np.float32)
+        mixed[:len(v)] += v
+        mixed[:len(bg)] += BACKGROUND_GAIN * bg
+        mixed[:min(len(v), len(bg))] /= 2
+        np.clip(mixed, -1.0, 1.0, out=mixed)
+        yield mixed
+
+def _encode_aac(blocks, sample_rate: int, channels: int, mixed_path: Path) -> subprocess.CompletedProcess:
+    """Encode float32 (frames x channels) blocks to AAC by streaming raw PCM into ffmpeg."""
+    cmd = [
+        'ffmpeg', '-nostdin', '-loglevel', 'error', '-nostats',
+        '-f', 'f32le', '-ar', str(sample_rate), '-ac', str(channels),
+        '-i', 'pipe:0',
+        '-ar', '44100',
+        '-ac', '2',
+        '-c:a', 'aac', '-b:a', '192k',
+        '-y', str(mixed_path)
+    ]
     
-    # Use FFmpeg to mix the two audio tracks
+    # ffmpeg only reports errors, so its stderr can't fill the pipe while we write
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        for block in blocks:
+            process.stdin.write(block.tobytes())
+    except BrokenPipeError:
+        pass  # ffmpeg exited early; its return code and stderr say why
+    finally:
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+    stderr = process.stderr.read()
+    process.wait()
+    return subprocess.CompletedProcess(cmd, process.returncode, stderr=stderr)
+
+def _mix_with_ffmpeg(dubbed_vocals_path: Path, background_path: Path, mixed_path: Path) -> subprocess.CompletedProcess:
     cmd = [
-        'ffmpeg',
+        'ffmpeg', '-nostdin', '-loglevel', 'error', '-nostats',
         '-i', str(dubbed_vocals_path),
         '-i', str(background_path),
         '-filter_complex',
-        '[0:a]volume=1.0[vocals];[1:a]volume=0.7[bg];[vocals][bg]amix=inputs=2:duration=longest',
+        f'[0:a]volume=1.0[vocals];[1:a]volume={BACKGROUND_GAIN}[bg];[vocals][bg]amix=inputs=2:duration=longest',
         '-ar', '44100',
         '-ac', '2',
+        '-c:a', 'aac', '-b:a', '192k',
         '-y', str(mixed_path)
     ]
     
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    return subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+def mix_audio_simple(dubbed_vocals_path: Path, background_path: Path) -> Path:
+    """
+    Simple mixing of dubbed vocals with background.
+    Both tracks are summed in NumPy a block at a time and streamed into ffmpeg,
+    which encodes the mix to AAC so muxing can stream-copy it. Tracks at
+    different sample rates are mixed with an ffmpeg filter graph instead.
+    
+    Args:
+        dubbed_vocals_path: Path to dubbed vocals
+        background_path: Path to background audio
+    
+    Returns:
+        Path to mixed audio file (AAC in an .m4a container)
+    """
+    print("Mixing dubbed vocals with background...")
+    
+    mixed_path = TEMP_DIR / "mixed_final.m4a"
+    
+    with sf.SoundFile(str(dubbed_vocals_path)) as vocals, sf.SoundFile(str(background_path)) as background:
+        if vocals.samplerate == background.samplerate:
+            channels = max(vocals.channels, background.channels)
+            result = _encode_aac(_mix_blocks(vocals, background, channels), vocals.samplerate, channels, mixed_path)
+        else:
+            result = _mix_with_ffmpeg(dubbed_vocals_path, background_path, mixed_path)
     
     if result.returncode != 0:
-        print(f"Mixing failed, using dubbed vocals only: {result.stderr}")
+        print(f"Mixing failed, using dubbed vocals only: {result.stderr.decode(errors='replace')}")
         return dubbed_vocals_path
     
     print(f"Mixed audio saved to: {mixed_path}")
-    return mixed_path
\ No newline at end of file
+    return mixed_path
@@ -1,7 +1,32 @@
 import subprocess
 from pathlib import Path
+from typing import List
 from ..config import OUTPUT_DIR
 
+# Audio already encoded to AAC (the mixed track) is copied rather than re-encoded
+AAC_SUFFIXES = {'.m4a', '.aac'}
+
+def _run_mux(video_path: Path, audio_path: Path, output_path: Path, video_codec: List[str]) -> subprocess.CompletedProcess:
+    if audio_path.suffix.lower() in AAC_SUFFIXES:
+        audio_codec = ['-c:a', 'copy']
+    else:
+        audio_codec = ['-c:a', 'aac', '-b:a', '192k']
+    
+    cmd = [
+        'ffmpeg', '-nostdin', '-loglevel', 'error', '-nostats',
+        '-i', str(video_path),
+        '-i', str(audio_path),
+        *video_codec,
+        *audio_codec,
+        '-map', '0:v:0',
+        '-map', '1:a:0',
+        '-movflags', '+faststart',
+        '-y', str(output_path)
+    ]
+    
+    # Only stderr is kept, for the error message; stdout carries nothing
+    return subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+
 def mux_video(video_path: Path, audio_path: Path, output_name: str = "output") -> Path:
     """
     Combine video with new dubbed audio track.
@@ -13,17 +38,14 @@ def mux_video(video_path: Path, audio_path: Path, output_name: str = "output") -
     print(f"  Audio: {audio_path}")
     print(f"  Output: {output_path}")
     
-    cmd = [
-        'ffmpeg', '-i', str(video_path),
-        '-i', str(audio_path),
-        '-c:v', 'copy',
-        '-c:a', 'aac', '-b:a', '192k',
-        '-map', '0:v:0',
-        '-map', '1:a:0',
-        '-y', str(output_path)
-    ]
+    # The video track is stream-copied: only the audio changes
+    result = _run_mux(video_path, audio_path, output_path, ['-c:v', 'copy'])
     
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        # Copying fails when the source codec cannot go into MP4
+        print("Video stream copy failed, re-encoding video...")
+        result = _run_mux(video_path, audio_path, output_path,
+                          ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '20'])
     
     if result.returncode != 0:
         raise Exception(f"FFmpeg muxing error: {result.stderr}")
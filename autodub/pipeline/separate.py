@@ -1,12 +1,60 @@
+import os
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Tuple
+from typing import Dict, Optional, Tuple
+import numpy as np
 import torch
 import torchaudio
 from demucs.pretrained import get_model
 from demucs.apply import apply_model
+import soundfile as sf
 from ..config import TEMP_DIR
 
+SEPARATION_BLOCK_SECONDS = 60  # Audio separated (and held in memory) per block
+SEPARATION_CONTEXT_SECONDS = 2  # Extra audio on each side of a block, crossfaded with its neighbour
+
+# Loaded models, keyed by (name, device), so repeated runs skip reloading the weights
+_MODEL_CACHE: Dict[Tuple[str, str], torch.nn.Module] = {}
+_model_cache_lock = threading.Lock()
+
+def _get_cached_model(name: str, device: str) -> torch.nn.Module:
+    with _model_cache_lock:
+        model = _MODEL_CACHE.get((name, device))
+        if model is None:
+            print("Loading Demucs model...")
+            model = get_model(name)
+            model.to(device)
+            model.eval()
+            _MODEL_CACHE[(name, device)] = model
+        return model
+
+@lru_cache(maxsize=None)
+def _get_resampler(orig_rate: int, target_rate: int) -> torchaudio.transforms.Resample:
+    # Resample precomputes its sinc kernel, so build one per rate pair and reuse it
+    return torchaudio.transforms.Resample(orig_rate, target_rate)
+
+def _autocast_dtype(device: str) -> Optional[torch.dtype]:
+    """Half-precision dtype for GPU inference, or None to stay in FP32 on CPU."""
+    if device != 'cuda':
+        return None
+    return torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+
+def _separate_block(model, waveform: torch.Tensor, device: str,
+                    pool: Optional[ThreadPoolExecutor] = None) -> torch.Tensor:
+    """
+    Separate one (channels, samples) block into (sources, channels, samples).
+    Demucs tiles the block into model-sized segments with a 25% crossfade,
+    running the segments concurrently on pool when one is given.
+    """
+    dtype = _autocast_dtype(device)
+    with torch.no_grad(), torch.autocast(device_type=device, dtype=dtype, enabled=dtype is not None):
+        sources = apply_model(model, waveform.unsqueeze(0), device=device,
+                              split=True, overlap=0.25, shifts=0, pool=pool)[0]
+    return sources.float()
+
 def separate_audio(audio_path: Path, use_separation: bool = True) -> Tuple[Path, Path]:
     """
     Separate audio into vocals and background using Demucs.
@@ -23,65 +71,103 @@ def separate_audio(audio_path: Path, use_separation: bool = True) -> Tuple[Path,
     
     if not use_separation:
         print("Source separation disabled, using original audio for both vocals and background")
-        # Just copy the original file
-        subprocess.run([
-            'ffmpeg', '-i', str(audio_path),
-            '-ar', '44100', '-ac', '2',
-            '-y', str(vocals_path)
-        ], capture_output=True, check=True)
-        
-        # Create quiet background
+        # One decode feeds both outputs: the original audio as "vocals" and a
+        # quiet copy as background
         subprocess.run([
-            'ffmpeg', '-i', str(audio_path),
-            '-ar', '44100', '-ac', '2',
-            '-filter:a', 'volume=0.1',
-            '-y', str(background_path)
-        ], capture_output=True, check=True)
+            'ffmpeg', '-nostdin', '-loglevel', 'error', '-nostats', '-y',
+            '-i', str(audio_path),
+            '-filter_complex', '[0:a]asplit=2[vocals][bg];[bg]volume=0.1[quiet]',
+            '-map', '[vocals]', '-ar', '44100', '-ac', '2', str(vocals_path),
+            '-map', '[quiet]', '-ar', '44100', '-ac', '2', str(background_path)
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
         
         return vocals_path, background_path
     
     try:
         print(f"Separating audio using Demucs: {audio_path}")
-        print("Loading Demucs model...")
-        
-        # Load the pretrained model
-        model = get_model('htdemucs')
-        device = 'cpu'
-        model.to(device)
-        
-        print("Processing audio...")
-        # Load audio with torchaudio
-        waveform, sample_rate = torchaudio.load(audio_path)
-        
-        # Ensure stereo audio
-        if waveform.shape[0] == 1:
-            waveform = waveform.repeat(2, 1)
-        
-        # Resample if needed
-        if sample_rate != model.samplerate:
-            resampler = torchaudio.transforms.Resample(sample_rate, model.samplerate)
-            waveform = resampler(waveform)
-            sample_rate = model.samplerate
         
-        # Move to device
-        waveform = waveform.to(device)
+        # Load the pretrained model (once per process)
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        model = _get_cached_model('htdemucs', device)
+        print(f"Using device: {device}")
         
-        print("Running source separation...")
-        # Apply the model
-        with torch.no_grad():
-            waveform_batch = waveform.unsqueeze(0)
-            sources = apply_model(model, waveform_batch, device=device)
+        info = torchaudio.info(str(audio_path))
+        source_rate = info.sample_rate
+        total_frames = info.num_frames
+        block_frames = SEPARATION_BLOCK_SECONDS * source_rate
+        context_frames = SEPARATION_CONTEXT_SECONDS * source_rate
         
-        # Extract vocals and accompaniment
-        # htdemucs outputs: [bass, drums, other, vocals]
-        vocals = sources[0, 3]  # vocals are at index 3
-        accompaniment = sources[0, 0] + sources[0, 1] + sources[0, 2]  # sum others
+        # Downloads are extracted at 44.1 kHz, htdemucs' own rate, so this is usually skipped
+        resampler = None
+        if source_rate != model.samplerate:
+            resampler = _get_resampler(source_rate, model.samplerate)
+        scale = model.samplerate / source_rate
         
-        # Save vocals
-        torchaudio.save(vocals_path, vocals.cpu(), sample_rate)
+        pool = None
+        previous_threads = None
+        if device == 'cpu':
+            # On CPU, Demucs runs its split segments on this pool. The intra-op
+            # threads are divided between the workers so they don't oversubscribe;
+            # the process-wide setting is restored once separation is done.
+            cpus = os.cpu_count() or 1
+            workers = min(4, max(1, cpus // 2))
+            previous_threads = torch.get_num_threads()
+            torch.set_num_threads(max(1, cpus // workers))
+            pool = ThreadPoolExecutor(max_workers=workers)
         
-        # Save background/accompaniment
-        torchaudio.save(background_path, accompaniment.cpu(), sample_rate)
+        print(f"Running source separation in {SEPARATION_BLOCK_SECONDS}s blocks...")
+        try:
+            # Only one block (plus context) is in memory at a time; results are
+            # appended to the output files as each block finishes. Neighbouring
+            # blocks overlap by both their contexts, and that overlap is
+            # crossfaded linearly (as apply_model blends its own segments), so
+            # block boundaries don't click. tail holds the previous block's
+            # separated end, not yet written.
+            tail = None
+            with sf.SoundFile(vocals_path, 'w', model.samplerate, 2, subtype='FLOAT') as vocals_file, \
+                 sf.SoundFile(background_path, 'w', model.samplerate, 2, subtype='FLOAT') as background_file:
+                for offset in range(0, total_frames, block_frames):
+                    read_start = max(0, offset - context_frames)
+                    read_end = min(total_frames, offset + block_frames + context_frames)
+                    waveform, _ = torchaudio.load(str(audio_path), frame_offset=read_start,
+                                                  num_frames=read_end - read_start)
+                    
+                    # Ensure stereo audio
+                    if waveform.shape[0] == 1:
+                        waveform = waveform.repeat(2, 1)
+                    
+                    # Resample if needed
+                    if resampler is not None:
+                        waveform = resampler(waveform)
+                    
+                    sources = _separate_block(model, waveform.to(device, non_blocking=True), device, pool)
+                    
+                    if tail is not None:
+                        n = min(tail.shape[-1], sources.shape[-1])
+                        fade = torch.linspace(0.0, 1.0, n, device=sources.device)
+                        sources[..., :n] = tail[..., :n] * (1.0 - fade) + sources[..., :n] * fade
+                    
+                    # Hold back the part the next block's context overlaps
+                    next_offset = offset + block_frames
+                    if next_offset < total_frames:
+                        held = round((read_end - (next_offset - context_frames)) * scale)
+                        tail = sources[..., -held:].clone()
+                        sources = sources[..., :-held]
+                    
+                    # Extract vocals and accompaniment
+                    # htdemucs outputs: [bass, drums, other, vocals]
+                    vocals = sources[3]  # vocals are at index 3
+                    accompaniment = sources[:3].sum(dim=0)  # sum others in one reduction
+                    
+                    # soundfile wants (frames, channels); the transposed views are
+                    # made contiguous once here rather than copied inside write()
+                    vocals_file.write(np.ascontiguousarray(vocals.cpu().numpy().T))
+                    background_file.write(np.ascontiguousarray(accompaniment.cpu().numpy().T))
+                    del sources, vocals, accompaniment
+        finally:
+            if pool is not None:
+                pool.shutdown()
+                torch.set_num_threads(previous_threads)
         
         print(f"Audio separated successfully:")
         print(f"  Vocals: {vocals_path}")
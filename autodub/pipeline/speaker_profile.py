@@ -1,82 +1,68 @@
 import librosa
 import numpy as np
 from pathlib import Path
-from typing import List, Dict, Tuple
-import subprocess
-import tempfile
+from typing import List, Dict, Optional, Tuple
+import os
+from concurrent.futures import ThreadPoolExecutor
+from ._ffmpeg import read_ranges
+from ._segments import segment_table, speaker_ids, speaker_rows, time_ranges
+from ._cache import profile_key, get_cached_profiles, cache_profiles
 
-def extract_speaker_audio(segments: List[Dict], vocals_path: Path, speaker_id: int) -> Path:
+# Profiles are summary statistics (pitch, centroid, ZCR, RMS) that stay stable
+# at telephone bandwidth, and analysis time scales with the sample count
+ANALYSIS_SAMPLE_RATE = 8000
+ANALYSIS_FRAME_LENGTH = 512  # Samples per ZCR frame (64 ms at 8 kHz)
+ANALYSIS_N_FFT = 2048  # STFT size shared by the pitch, centroid and RMS features
+ANALYSIS_MAX_SECONDS = 30  # The statistics converge well before this much speech
+
+# Everything that changes what a profile contains, so cached profiles are keyed on it
+ANALYSIS_PARAMS = (ANALYSIS_SAMPLE_RATE, ANALYSIS_FRAME_LENGTH, ANALYSIS_N_FFT, ANALYSIS_MAX_SECONDS)
+
+def _analysis_rows(rows: np.ndarray) -> np.ndarray:
     """
-    Extract audio segments for a specific speaker and concatenate them.
+    The highest-confidence rows covering ANALYSIS_MAX_SECONDS of speech (all rows
+    if there is less), back in timeline order.
     """
-    temp_files = []
-    
-    try:
-        # Create temporary files for each segment of this speaker
-        for i, segment in enumerate(segments):
-            if segment['speaker'] == speaker_id:
-                temp_file = Path(tempfile.mktemp(suffix='.wav'))
-                temp_files.append(temp_file)
-                
-                # Extract this segment using ffmpeg
-                subprocess.run([
-                    'ffmpeg', '-i', str(vocals_path),
-                    '-ss', str(segment['start']),
-                    '-t', str(segment['end'] - segment['start']),
-                    '-ar', '22050', '-ac', '1',  # Mono, 22050 Hz for analysis
-                    '-y', str(temp_file)
-                ], capture_output=True, check=True)
-        
-        if not temp_files:
-            raise ValueError(f"No segments found for speaker {speaker_id}")
-        
-        # Concatenate all segments for this speaker
-        speaker_audio_path = Path(tempfile.mktemp(suffix=f'_speaker_{speaker_id}.wav'))
-        
-        if len(temp_files) == 1:
-            # If only one segment, just copy it
-            subprocess.run(['cp', str(temp_files[0]), str(speaker_audio_path)], check=True)
-        else:
-            # Concatenate multiple segments
-            input_list = '|'.join(str(f) for f in temp_files)
-            subprocess.run([
-                'ffmpeg', '-i', f'concat:{input_list}',
-                '-acodec', 'copy', '-y', str(speaker_audio_path)
-            ], capture_output=True, check=True)
-        
-        return speaker_audio_path
-        
-    finally:
-        # Clean up temporary files
-        for temp_file in temp_files:
-            if temp_file.exists():
-                temp_file.unlink()
+    by_confidence = rows[np.argsort(-rows['confidence'], kind='stable')]
+    covered = np.cumsum(by_confidence['end'] - by_confidence['start'])
+    keep = int(np.searchsorted(covered, ANALYSIS_MAX_SECONDS)) + 1
+    return np.sort(by_confidence[:keep], order='index')
+
+def _default_characteristics() -> Dict:
+    return {
+        'mean_pitch': 150.0,
+        'pitch_std': 20.0,
+        'pitch_range': 50.0,
+        'spectral_centroid': 2000.0,
+        'zero_crossing_rate': 0.1,
+        'rms_energy': 0.1,
+        'estimated_gender': 'neutral',
+        'gender_confidence': 0.5
+    }
 
-def analyze_speaker_characteristics(audio_path: Path) -> Dict:
+def analyze_speaker_samples(y: np.ndarray, sr: int) -> Dict:
     """
-    Analyze vocal characteristics of a speaker's audio.
+    Analyze vocal characteristics of mono float samples at sample rate sr.
     Returns characteristics that can be used for voice matching.
     """
     try:
-        # Load audio
-        y, sr = librosa.load(audio_path, sr=22050)
-        
         if len(y) < sr * 0.5:  # Less than 0.5 seconds
             print(f"Warning: Very short audio sample for analysis ({len(y)/sr:.2f}s)")
         
         # Extract features
         characteristics = {}
         
+        # One magnitude spectrogram feeds every spectral feature below
+        S = np.abs(librosa.stft(y, n_fft=ANALYSIS_N_FFT))
+        
         # Fundamental frequency (pitch)
-        pitches, magnitudes = librosa.piptrack(y=y, sr=sr)
-        pitch_values = []
-        for t in range(pitches.shape[1]):
-            index = magnitudes[:, t].argmax()
-            pitch = pitches[index, t]
-            if pitch > 0:
-                pitch_values.append(pitch)
-        
-        if pitch_values:
+        pitches, magnitudes = librosa.piptrack(S=S, sr=sr)
+        # Pitch of the strongest bin in each frame, keeping voiced frames only
+        strongest = magnitudes.argmax(axis=0)
+        pitch_values = pitches[strongest, np.arange(pitches.shape[1])]
+        pitch_values = pitch_values[pitch_values > 0]
+        
+        if pitch_values.size:
             characteristics['mean_pitch'] = np.mean(pitch_values)
             characteristics['pitch_std'] = np.std(pitch_values)
             characteristics['pitch_range'] = np.max(pitch_values) - np.min(pitch_values)
@@ -86,15 +72,15 @@ def analyze_speaker_characteristics(audio_path: Path) -> Dict:
             characteristics['pitch_range'] = 50.0
         
         # Spectral features
-        spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
+        spectral_centroids = librosa.feature.spectral_centroid(S=S, sr=sr)[0]
         characteristics['spectral_centroid'] = np.mean(spectral_centroids)
         
         # Zero crossing rate (roughness indicator)
-        zcr = librosa.feature.zero_crossing_rate(y)[0]
+        zcr = librosa.feature.zero_crossing_rate(y, frame_length=ANALYSIS_FRAME_LENGTH)[0]
         characteristics['zero_crossing_rate'] = np.mean(zcr)
         
         # Energy/loudness
-        rms = librosa.feature.rms(y=y)[0]
+        rms = librosa.feature.rms(S=S, frame_length=ANALYSIS_N_FFT)[0]
         characteristics['rms_energy'] = np.mean(rms)
         
         # Estimate gender based on pitch
@@ -114,70 +100,86 @@ def analyze_speaker_characteristics(audio_path: Path) -> Dict:
     except Exception as e:
         print(f"Error analyzing speaker characteristics: {e}")
         # Return default characteristics
+        return _default_characteristics()
+
+def _analyze_speaker(table: np.ndarray, vocals_path: Path, speaker_id: int) -> Tuple[Dict, bool]:
+    """
+    Profile one speaker. Returns the profile and whether the analysis succeeded
+    (a minimal fallback profile is returned if it did not).
+    """
+    print(f"Analyzing speaker {speaker_id}...")
+    
+    rows = speaker_rows(table, speaker_id)
+    segment_count = len(rows)
+    total_duration = float((rows['end'] - rows['start']).sum())
+    
+    try:
+        if not segment_count:
+            raise ValueError(f"No segments found for speaker {speaker_id}")
+        
+        # Decode this speaker's audio straight into memory and analyze it
+        samples = read_ranges(vocals_path, time_ranges(_analysis_rows(rows)), ANALYSIS_SAMPLE_RATE)
+        characteristics = analyze_speaker_samples(samples, ANALYSIS_SAMPLE_RATE)
+        
+        # Add segment count and total duration
+        characteristics['segment_count'] = segment_count
+        characteristics['total_duration'] = total_duration
+        
+        print(f"Speaker {speaker_id}: {characteristics['estimated_gender']} "
+              f"({characteristics['mean_pitch']:.1f}Hz pitch, "
+              f"{characteristics['segment_count']} segments)")
+        
+        return characteristics, True
+        
+    except Exception as e:
+        print(f"Failed to analyze speaker {speaker_id}: {e}")
+        # Create minimal profile
         return {
             'mean_pitch': 150.0,
-            'pitch_std': 20.0,
-            'pitch_range': 50.0,
-            'spectral_centroid': 2000.0,
-            'zero_crossing_rate': 0.1,
-            'rms_energy': 0.1,
             'estimated_gender': 'neutral',
-            'gender_confidence': 0.5
-        }
+            'gender_confidence': 0.5,
+            'segment_count': segment_count,
+            'total_duration': total_duration
+        }, False
 
-def build_speaker_profiles(segments: List[Dict], vocals_path: Path) -> Dict[int, Dict]:
+def build_speaker_profiles(segments: List[Dict], vocals_path: Path, table: Optional[np.ndarray] = None) -> Dict[int, Dict]:
     """
     Build vocal characteristic profiles for each speaker.
+    Speakers are analyzed concurrently: ffmpeg extraction and librosa's
+    numeric work both run outside the GIL. Each profile is measured on at most
+    ANALYSIS_MAX_SECONDS of the speaker's most confident segments.
     
     Args:
         segments: List of transcribed segments with speaker IDs
         vocals_path: Path to separated vocals audio file
+        table: segment_table(segments), if the caller already built it
         
     Returns:
         Dictionary mapping speaker_id -> characteristics
     """
     print("Building speaker profiles...")
     
-    # Get unique speakers
-    speakers = set(segment['speaker'] for segment in segments)
-    print(f"Found {len(speakers)} unique speakers: {sorted(speakers)}")
+    key = profile_key(vocals_path, segments, ANALYSIS_PARAMS)
+    cached = get_cached_profiles(key)
+    if cached is not None:
+        print(f"Reusing cached profiles for {len(cached)} speakers")
+        return cached
+    
+    # Get unique speakers (the table groups segments by speaker for the lookups below)
+    if table is None:
+        table = segment_table(segments)
+    speakers = speaker_ids(table)
+    print(f"Found {len(speakers)} unique speakers: {speakers}")
+    
+    if not speakers:
+        return {}
     
-    profiles = {}
+    with ThreadPoolExecutor(max_workers=min(len(speakers), os.cpu_count() or 1)) as executor:
+        results = list(executor.map(lambda speaker_id: _analyze_speaker(table, vocals_path, speaker_id), speakers))
     
-    for speaker_id in speakers:
-        print(f"Analyzing speaker {speaker_id}...")
-        
-        try:
-            # Extract audio for this speaker
-            speaker_audio_path = extract_speaker_audio(segments, vocals_path, speaker_id)
-            
-            # Analyze characteristics
-            characteristics = analyze_speaker_characteristics(speaker_audio_path)
-            
-            # Add segment count and total duration
-            speaker_segments = [s for s in segments if s['speaker'] == speaker_id]
-            characteristics['segment_count'] = len(speaker_segments)
-            characteristics['total_duration'] = sum(s['end'] - s['start'] for s in speaker_segments)
-            
-            profiles[speaker_id] = characteristics
-            
-            print(f"Speaker {speaker_id}: {characteristics['estimated_gender']} "
-                  f"({characteristics['mean_pitch']:.1f}Hz pitch, "
-                  f"{characteristics['segment_count']} segments)")
-            
-            # Clean up temporary file
-            if speaker_audio_path.exists():
-                speaker_audio_path.unlink()
-                
-        except Exception as e:
-            print(f"Failed to analyze speaker {speaker_id}: {e}")
-            # Create minimal profile
-            profiles[speaker_id] = {
-                'mean_pitch': 150.0,
-                'estimated_gender': 'neutral',
-                'gender_confidence': 0.5,
-                'segment_count': len([s for s in segments if s['speaker'] == speaker_id]),
-                'total_duration': sum(s['end'] - s['start'] for s in segments if s['speaker'] == speaker_id)
-            }
+    profiles = {speaker_id: profile for speaker_id, (profile, _) in zip(speakers, results)}
     
-    return profiles
\ No newline at end of file
+    # Fallback profiles are not cached, so a transient failure is retried next run
+    if all(ok for _, ok in results):
+        cache_profiles(key, profiles)
+    return profiles
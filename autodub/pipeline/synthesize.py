@@ -1,7 +1,10 @@
+import queue
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict
-from ..config import ELEVENLABS_API_KEY, ELEVENLABS_BASE_URL, DEFAULT_VOICE_ID, TEMP_DIR
+from typing import List, Dict, Iterable, Optional, Tuple
+from ..config import ELEVENLABS_API_KEY, ELEVENLABS_BASE_URL, DEFAULT_VOICE_ID, TEMP_DIR, SYNTHESIS_CONCURRENCY, HTTP_SESSION
+from ._cache import get_cached_speech, cache_speech
 
 VOICE_MAP = {
     0: "21m00Tcm4TlvDq8ikWAM",  # Rachel (female)
@@ -10,50 +13,127 @@ VOICE_MAP = {
     3: "ThT5KcBeYPX3keUQqHPh",  # Dorothy (female)
 }
 
-def synthesize_segments(segments: List[Dict], target_language_code: str = "es") -> List[Dict]:
+OUTPUT_FORMAT = "mp3_44100_128"
+
+# Lets ElevenLabs start sending audio before the whole clip is generated
+STREAM_PARAMS = {
+    "optimize_streaming_latency": 3,
+    "output_format": OUTPUT_FORMAT,
+}
+
+def stream_speech(voice_id: str, data: Dict, headers: Dict, audio_path: Path) -> requests.Response:
     """
-    Synthesize speech for each translated segment using ElevenLabs.
-    Returns segments with audio file paths added.
+    Synthesize with the ElevenLabs streaming endpoint, writing audio chunks to
+    audio_path as they arrive. audio_path is only written for HTTP 200;
+    the response is returned either way.
     """
-    print(f"Synthesizing {len(segments)} segments")
+    url = f"{ELEVENLABS_BASE_URL}/text-to-speech/{voice_id}/stream"
     
+    with HTTP_SESSION.post(url, params=STREAM_PARAMS, json=data, headers=headers, stream=True) as response:
+        if response.status_code == 200:
+            with open(audio_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=16384):
+                    f.write(chunk)
+        else:
+            response.content  # Read the error body before the connection is released
+    
+    return response
+
+def _synthesize_segment(i: int, segment: Dict, headers: Dict, language_code: str, total: int):
+    """Synthesize one segment, storing the result in segment['audio_path']."""
+    try:
+        voice_id = VOICE_MAP.get(segment.get('speaker', 0), DEFAULT_VOICE_ID)
+        text = segment.get('text_translated', segment['text'])
+
+        data = {
+            "text": text,
+            "model_id": "eleven_multilingual_v2",
+            "voice_settings": {
+                "stability": 0.5,
+                "similarity_boost": 0.8,
+                "style": 0.0,
+                "use_speaker_boost": True
+            }
+        }
+
+        cached_path = get_cached_speech(voice_id, data, language_code, OUTPUT_FORMAT)
+        if cached_path:
+            segment['audio_path'] = cached_path
+            print(f"Synthesized segment {i+1}/{total}: {cached_path.name} (cached)")
+            return
+
+        audio_path = TEMP_DIR / f"segment_{i:04d}.mp3"
+        response = stream_speech(voice_id, data, headers, audio_path)
+
+        if response.status_code == 200:
+            cache_speech(audio_path, voice_id, data, language_code, OUTPUT_FORMAT)
+            segment['audio_path'] = audio_path
+            print(f"Synthesized segment {i+1}/{total}: {audio_path.name}")
+        else:
+            print(f"Error synthesizing segment {i}: {response.status_code} - {response.text}")
+            segment['audio_path'] = None
+
+    except Exception as e:
+        print(f"Synthesis error for segment {i}: {e}")
+        segment['audio_path'] = None
+
+def synthesize_segments(
+    segments: List[Dict],
+    target_language_code: str = "es",
+    max_workers: int = SYNTHESIS_CONCURRENCY,
+    ready: Optional[Iterable[List[Dict]]] = None
+) -> List[Dict]:
+    """
+    Synthesize speech for each translated segment using ElevenLabs,
+    with up to max_workers requests in flight at once.
+    If given, ready yields batches of segments as their translations become
+    available (see translate.iter_translated_batches); each batch is
+    submitted as soon as it arrives, overlapping synthesis with translation.
+    Returns segments with audio file paths added.
+    """
+    print(f"Synthesizing {len(segments)} segments ({max_workers} concurrent requests)")
+
     headers = {
         "Accept": "audio/mpeg",
         "Content-Type": "application/json",
         "xi-api-key": ELEVENLABS_API_KEY
     }
-    
-    for i, segment in enumerate(segments):
-        try:
-            voice_id = VOICE_MAP.get(segment.get('speaker', 0), DEFAULT_VOICE_ID)
-            
-            url = f"{ELEVENLABS_BASE_URL}/text-to-speech/{voice_id}"
-            
-            data = {
-                "text": segment.get('text_translated', segment['text']),
-                "model_id": "eleven_multilingual_v2",
-                "voice_settings": {
-                    "stability": 0.5,
-                    "similarity_boost": 0.8,
-                    "style": 0.0,
-                    "use_speaker_boost": True
-                }
-            }
-            
-            response = requests.post(url, json=data, headers=headers)
-            
-            if response.status_code == 200:
-                audio_path = TEMP_DIR / f"segment_{i:04d}.mp3"
-                with open(audio_path, 'wb') as f:
-                    f.write(response.content)
-                segment['audio_path'] = audio_path
-                print(f"Synthesized segment {i+1}/{len(segments)}: {audio_path.name}")
-            else:
-                print(f"Error synthesizing segment {i}: {response.status_code} - {response.text}")
-                segment['audio_path'] = None
-                
-        except Exception as e:
-            print(f"Synthesis error for segment {i}: {e}")
-            segment['audio_path'] = None
-    
-    return segments
\ No newline at end of file
+
+    index = {id(segment): i for i, segment in enumerate(segments)}
+
+    # Identical (voice, text) pairs are synthesized once and share the audio file
+    groups: Dict[Tuple[str, str], List[Dict]] = {}
+
+    # Request latency grows with text length, so whenever a worker frees up it takes
+    # the longest pending line (bucketed by 50 characters, then timeline order),
+    # across every batch received so far, to keep a slow request from trailing
+    pending = queue.PriorityQueue()
+
+    def run_longest():
+        _, i = pending.get_nowait()
+        _synthesize_segment(i, segments[i], headers, target_language_code, len(segments))
+
+    # Each worker writes into its own segment dict, so timeline order is preserved
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for batch in (ready if ready is not None else [segments]):
+            queued = 0
+            for segment in batch:
+                text = segment.get('text_translated', segment['text'])
+                members = groups.setdefault((VOICE_MAP.get(segment.get('speaker', 0), DEFAULT_VOICE_ID), text), [])
+                if not members:
+                    pending.put((-(len(text) // 50), index[id(segment)]))
+                    queued += 1
+                members.append(segment)
+
+            # Queue the whole batch first; each task runs whichever line is longest when it starts
+            for _ in range(queued):
+                executor.submit(run_longest)
+
+    if len(groups) < len(segments):
+        print(f"Synthesized {len(groups)} unique lines for {len(segments)} segments")
+
+    for representative, *duplicates in groups.values():
+        for segment in duplicates:
+            segment['audio_path'] = representative['audio_path']
+
+    return segments
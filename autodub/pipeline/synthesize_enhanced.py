@@ -1,23 +1,115 @@
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict
-from ..config import ELEVENLABS_API_KEY, ELEVENLABS_BASE_URL, TEMP_DIR
+from typing import List, Dict, Optional, Tuple
+from ..config import ELEVENLABS_API_KEY, TEMP_DIR, SYNTHESIS_CONCURRENCY
 from .voice_mapper import get_voice_settings_for_speaker
+from .synthesize import stream_speech, OUTPUT_FORMAT
+from ._cache import get_cached_speech, cache_speech
+
+def _speaker_voice(
+    speaker_id: int,
+    voice_assignments: Dict[int, str],
+    speaker_profiles: Optional[Dict[int, Dict]]
+) -> Tuple[str, Dict]:
+    """The voice_id and voice settings every segment of speaker_id is synthesized with."""
+    # Get assigned voice for this speaker
+    voice_id = voice_assignments.get(speaker_id)
+    if not voice_id:
+        print(f"Warning: No voice assigned to speaker {speaker_id}, using default")
+        voice_id = "21m00Tcm4TlvDq8ikWAM"  # Rachel fallback
+    
+    # Get optimized settings for this speaker
+    if speaker_profiles and speaker_id in speaker_profiles:
+        voice_settings = get_voice_settings_for_speaker(speaker_profiles[speaker_id])
+    else:
+        voice_settings = {
+            "stability": 0.5,
+            "similarity_boost": 0.8,
+            "style": 0.0,
+            "use_speaker_boost": True
+        }
+    
+    return voice_id, voice_settings
+
+def _synthesize_one(
+    i: int,
+    segment: Dict,
+    voice: Tuple[str, Dict],
+    headers: Dict,
+    target_language_code: str,
+    show_voice: bool,
+    total: int
+) -> bool:
+    """
+    Synthesize one segment with its speaker's (voice_id, voice_settings),
+    storing the result in the segment dict. Returns whether synthesis succeeded.
+    """
+    speaker_id = segment.get('speaker', 0)
+    voice_id, voice_settings = voice
+    
+    try:
+        text = segment.get('text_translated', segment['text'])
+        
+        data = {
+            "text": text,
+            "model_id": "eleven_multilingual_v2",
+            "voice_settings": voice_settings
+        }
+        
+        cached_path = get_cached_speech(voice_id, data, target_language_code, OUTPUT_FORMAT)
+        if cached_path:
+            segment['audio_path'] = cached_path
+            segment['voice_id'] = voice_id
+            segment['synthesis_success'] = True
+            print(f"✓ Segment {i+1}/{total}: Speaker {speaker_id} (cached)")
+            return True
+        
+        audio_path = TEMP_DIR / f"segment_{i:04d}.mp3"
+        response = stream_speech(voice_id, data, headers, audio_path)
+        
+        if response.status_code == 200:
+            cache_speech(audio_path, voice_id, data, target_language_code, OUTPUT_FORMAT)
+            
+            segment['audio_path'] = audio_path
+            segment['voice_id'] = voice_id
+            segment['synthesis_success'] = True
+            
+            # Show progress with speaker info
+            speaker_info = f"Speaker {speaker_id}"
+            if show_voice:  # Only show voice info if multiple speakers
+                voice_name = voice_id[:8] + "..."
+                speaker_info += f" ({voice_name})"
+            
+            print(f"✓ Segment {i+1}/{total}: {speaker_info}")
+            return True
+        
+        print(f"✗ Segment {i+1}: HTTP {response.status_code} - {response.text[:100]}")
+        
+    except Exception as e:
+        print(f"✗ Segment {i+1}: Error - {e}")
+    
+    segment['audio_path'] = None
+    segment['synthesis_success'] = False
+    return False
 
 def synthesize_segments_enhanced(
     segments: List[Dict], 
     voice_assignments: Dict[int, str], 
     target_language_code: str = "es",
-    speaker_profiles: Dict[int, Dict] = None
+    speaker_profiles: Dict[int, Dict] = None,
+    max_workers: int = SYNTHESIS_CONCURRENCY
 ) -> List[Dict]:
     """
     Enhanced synthesis with speaker-specific voice assignments and optimized settings.
+    Up to max_workers requests are in flight at once; each result is written
+    back into its own segment dict, so timeline order is preserved.
     
     Args:
         segments: List of translated segments with speaker IDs
         voice_assignments: Dictionary mapping speaker_id -> voice_id  
         target_language_code: Target language code
         speaker_profiles: Optional speaker profiles for voice optimization
+        max_workers: Maximum number of concurrent ElevenLabs requests
         
     Returns:
         Segments with audio file paths added
@@ -30,81 +122,49 @@ def synthesize_segments_enhanced(
         "xi-api-key": ELEVENLABS_API_KEY
     }
     
+    # Voices and settings only depend on the speaker, so resolve them once each
+    voices = {speaker_id: _speaker_voice(speaker_id, voice_assignments, speaker_profiles)
+              for speaker_id in {segment.get('speaker', 0) for segment in segments}}
+    show_voice = len(voice_assignments) > 1
+    
+    # Identical (voice, settings, text) lines are synthesized once and share the audio file,
+    # since copies in flight together would all miss the speech cache
+    groups: Dict[Tuple, List[int]] = {}
+    for i, segment in enumerate(segments):
+        voice_id, voice_settings = voices[segment.get('speaker', 0)]
+        key = (voice_id, tuple(sorted(voice_settings.items())), segment.get('text_translated', segment['text']))
+        groups.setdefault(key, []).append(i)
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        representatives = [members[0] for members in groups.values()]
+        results = dict(zip(representatives, executor.map(
+            lambda i: _synthesize_one(i, segments[i], voices[segments[i].get('speaker', 0)], headers,
+                                      target_language_code, show_voice, len(segments)),
+            representatives
+        )))
+    
+    if len(groups) < len(segments):
+        print(f"Synthesized {len(groups)} unique lines for {len(segments)} segments")
+    
+    outcomes = [False] * len(segments)
+    for representative, *duplicates in groups.values():
+        outcomes[representative] = results[representative]
+        for i in duplicates:
+            for field in ('audio_path', 'voice_id', 'synthesis_success'):
+                if field in segments[representative]:
+                    segments[i][field] = segments[representative][field]
+            outcomes[i] = results[representative]
+    
     # Track synthesis stats
     synthesis_stats = {}
     for speaker_id in voice_assignments.keys():
         synthesis_stats[speaker_id] = {'segments': 0, 'success': 0, 'failed': 0}
     
-    for i, segment in enumerate(segments):
-        speaker_id = segment.get('speaker', 0)
-        
-        # Update stats
-        if speaker_id in synthesis_stats:
-            synthesis_stats[speaker_id]['segments'] += 1
-        
-        try:
-            # Get assigned voice for this speaker
-            voice_id = voice_assignments.get(speaker_id)
-            if not voice_id:
-                print(f"Warning: No voice assigned to speaker {speaker_id}, using default")
-                voice_id = "21m00Tcm4TlvDq8ikWAM"  # Rachel fallback
-            
-            # Get optimized settings for this speaker
-            if speaker_profiles and speaker_id in speaker_profiles:
-                voice_settings = get_voice_settings_for_speaker(speaker_profiles[speaker_id])
-            else:
-                voice_settings = {
-                    "stability": 0.5,
-                    "similarity_boost": 0.8,
-                    "style": 0.0,
-                    "use_speaker_boost": True
-                }
-            
-            url = f"{ELEVENLABS_BASE_URL}/text-to-speech/{voice_id}"
-            
-            data = {
-                "text": segment.get('text_translated', segment['text']),
-                "model_id": "eleven_multilingual_v2",
-                "voice_settings": voice_settings
-            }
-            
-            response = requests.post(url, json=data, headers=headers)
-            
-            if response.status_code == 200:
-                audio_path = TEMP_DIR / f"segment_{i:04d}.mp3"
-                with open(audio_path, 'wb') as f:
-                    f.write(response.content)
-                
-                segment['audio_path'] = audio_path
-                segment['voice_id'] = voice_id
-                segment['synthesis_success'] = True
-                
-                if speaker_id in synthesis_stats:
-                    synthesis_stats[speaker_id]['success'] += 1
-                
-                # Show progress with speaker info
-                speaker_info = f"Speaker {speaker_id}"
-                if len(voice_assignments) > 1:  # Only show voice info if multiple speakers
-                    voice_name = voice_id[:8] + "..."
-                    speaker_info += f" ({voice_name})"
-                
-                print(f"✓ Segment {i+1}/{len(segments)}: {speaker_info}")
-                
-            else:
-                print(f"✗ Segment {i+1}: HTTP {response.status_code} - {response.text[:100]}")
-                segment['audio_path'] = None
-                segment['synthesis_success'] = False
-                
-                if speaker_id in synthesis_stats:
-                    synthesis_stats[speaker_id]['failed'] += 1
-                
-        except Exception as e:
-            print(f"✗ Segment {i+1}: Error - {e}")
-            segment['audio_path'] = None
-            segment['synthesis_success'] = False
-            
-            if speaker_id in synthesis_stats:
-                synthesis_stats[speaker_id]['failed'] += 1
+    for segment, succeeded in zip(segments, outcomes):
+        stats = synthesis_stats.get(segment.get('speaker', 0))
+        if stats is not None:
+            stats['segments'] += 1
+            stats['success' if succeeded else 'failed'] += 1
     
     # Print synthesis summary
     print(f"\n📊 Synthesis Summary:")
@@ -1,7 +1,35 @@
+import subprocess
+import tempfile
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from deepgram import DeepgramClient, PrerecordedOptions, FileSource
-from ..config import DEEPGRAM_API_KEY
+from ..config import DEEPGRAM_API_KEY, TEMP_DIR
+
+@lru_cache(maxsize=None)
+def _deepgram_client() -> DeepgramClient:
+    return DeepgramClient(DEEPGRAM_API_KEY)
+
+def _encode_for_upload(audio_path: Path) -> Path:
+    """
+    Re-encode audio to 32 kbps mono Opus for upload, roughly a tenth of the
+    size of the WAV. Returns audio_path unchanged if ffmpeg fails.
+    """
+    # Unique per call, so concurrent jobs never encode over each other's upload
+    with tempfile.NamedTemporaryFile(suffix='.ogg', dir=TEMP_DIR, delete=False) as upload:
+        upload_path = Path(upload.name)
+    result = subprocess.run([
+        'ffmpeg', '-nostdin', '-loglevel', 'error', '-nostats',
+        '-i', str(audio_path),
+        '-vn', '-ac', '1', '-c:a', 'libopus', '-b:a', '32k',
+        '-y', str(upload_path)
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    
+    if result.returncode != 0:
+        print(f"Opus encode failed, uploading original audio: {result.stderr}")
+        upload_path.unlink(missing_ok=True)
+        return audio_path
+    return upload_path
 
 def transcribe_audio(audio_path: Path) -> List[Dict]:
     """
@@ -10,14 +38,9 @@ def transcribe_audio(audio_path: Path) -> List[Dict]:
     """
     print(f"Transcribing audio: {audio_path}")
     
-    deepgram = DeepgramClient(DEEPGRAM_API_KEY)
+    deepgram = _deepgram_client()
     
-    with open(audio_path, 'rb') as audio:
-        buffer_data = audio.read()
-    
-    payload: FileSource = {
-        "buffer": buffer_data,
-    }
+    upload_path = _encode_for_upload(audio_path)
     
     options = PrerecordedOptions(
         model="nova-2",
@@ -25,63 +48,47 @@ def transcribe_audio(audio_path: Path) -> List[Dict]:
         utterances=True,
         diarize=True,
         punctuate=True,
-        language="en"
-        # Removed multichannel to avoid duplicates
+        language="en",
+        multichannel=False  # Per-channel results would duplicate every utterance
     )
     
-    response = deepgram.listen.prerecorded.v("1").transcribe_file(payload, options)
+    # Stream the file from disk rather than reading it into memory first
+    try:
+        with open(upload_path, 'rb') as audio:
+            payload: FileSource = {
+                "stream": audio,
+            }
+            response = deepgram.listen.prerecorded.v("1").transcribe_file(payload, options)
+    finally:
+        if upload_path != audio_path:
+            upload_path.unlink(missing_ok=True)
     
-    segments = []
+    # Utterances with the same timing and speaker are duplicates; keep the
+    # most confident one as they arrive
+    best: Dict[Tuple[float, float, int], Dict] = {}
+    duplicates_removed = 0
     if hasattr(response, 'results') and response.results.utterances:
         for utterance in response.results.utterances:
-            segment = {
+            key = (round(utterance.start, 2), round(utterance.end, 2), utterance.speaker)
+            kept = best.get(key)
+            if kept is not None:
+                duplicates_removed += 1
+                if kept['confidence'] >= utterance.confidence:
+                    continue
+            best[key] = {
                 'start': utterance.start,
                 'end': utterance.end,
                 'text': utterance.transcript,
                 'speaker': utterance.speaker,
                 'confidence': utterance.confidence
             }
-            segments.append(segment)
-            print(f"[{segment['start']:.2f}s - {segment['end']:.2f}s] Speaker {segment['speaker']}: {segment['text'][:50]}...")
-    
-    # Deduplicate segments (remove duplicates with same timing and speaker)
-    segments = deduplicate_segments(segments)
-    
-    print(f"Transcribed {len(segments)} segments")
-    return segments
-
-def deduplicate_segments(segments: List[Dict]) -> List[Dict]:
-    """
-    Remove duplicate segments with same start time, end time, and speaker.
-    Keep the one with highest confidence.
-    """
-    if not segments:
-        return segments
     
-    # Group by (start, end, speaker)
-    segment_groups = {}
+    segments = sorted(best.values(), key=lambda x: x['start'])
     for segment in segments:
-        key = (round(segment['start'], 2), round(segment['end'], 2), segment['speaker'])
-        if key not in segment_groups:
-            segment_groups[key] = []
-        segment_groups[key].append(segment)
-    
-    # Keep best segment from each group
-    deduplicated = []
-    duplicates_removed = 0
-    
-    for key, group in segment_groups.items():
-        if len(group) > 1:
-            # Multiple segments with same timing - keep highest confidence
-            best_segment = max(group, key=lambda x: x.get('confidence', 0))
-            deduplicated.append(best_segment)
-            duplicates_removed += len(group) - 1
-        else:
-            deduplicated.append(group[0])
+        print(f"[{segment['start']:.2f}s - {segment['end']:.2f}s] Speaker {segment['speaker']}: {segment['text'][:50]}...")
     
     if duplicates_removed > 0:
         print(f"Removed {duplicates_removed} duplicate segments")
     
-    # Sort by start time
-    deduplicated.sort(key=lambda x: x['start'])
-    return deduplicated
\ No newline at end of file
+    print(f"Transcribed {len(segments)} segments")
+    return segments
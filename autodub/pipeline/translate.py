@@ -1,41 +1,179 @@
-from typing import List, Dict
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from itertools import islice
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
 from openai import OpenAI
-from ..config import OPENAI_API_KEY
+from ..config import OPENAI_API_KEY, TRANSLATION_BATCH_SIZE, TRANSLATION_CONCURRENCY
+from ._cache import get_cached_translation, cache_translation
 
-def translate_segments(segments: List[Dict], target_language: str = "Spanish") -> List[Dict]:
+@lru_cache(maxsize=None)
+def _openai_client() -> OpenAI:
+    # Shared so every batch reuses the client's connection pool
+    return OpenAI(api_key=OPENAI_API_KEY)
+
+def _system_prompt(target_language: str) -> str:
+    return (f"You are a professional translator. Translate the following text to {target_language}. "
+            f"Maintain the tone and style of the original. Keep the translation concise and natural. "
+            f"Do not add any explanations, just provide the translation.")
+
+def _batched(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def _dedupe_key(text: str) -> str:
+    # Case is kept: "US" and "us" (or "May" and "may") can translate differently,
+    # and every member's exact text is cached with the shared translation
+    return text.strip()
+
+def translate_text(client: OpenAI, text: str, target_language: str) -> str:
     """
-    Translate each segment to target language using OpenAI.
-    Preserves timing and speaker information.
+    Translate a single piece of text with one chat completion.
+    """
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {
+                "role": "system",
+                "content": _system_prompt(target_language)
+            },
+            {
+                "role": "user",
+                "content": text
+            }
+        ],
+        temperature=0.3,
+        max_tokens=500
+    )
+
+    return response.choices[0].message.content.strip()
+
+def translate_segments_batch(client: OpenAI, segments: List[Dict], target_language: str) -> List[str]:
     """
-    print(f"Translating {len(segments)} segments to {target_language}")
-    
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    
+    Translate a batch of segments with a single chat completion.
+    The texts are sent as a JSON array and the reply must contain exactly one
+    translation per input, in order. Raises ValueError if it does not.
+    """
+    texts = [segment['text'] for segment in segments]
+
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {
+                "role": "system",
+                "content": _system_prompt(target_language) +
+                           " You will receive a JSON array of strings. Reply with a JSON object of the form "
+                           "{\"translations\": [...]} containing exactly one translation per input string, "
+                           "in the same order."
+            },
+            {
+                "role": "user",
+                "content": json.dumps(texts, ensure_ascii=False)
+            }
+        ],
+        temperature=0.3,
+        max_tokens=min(500 * len(texts), 16000),
+        response_format={"type": "json_object"}
+    )
+
+    try:
+        translations = json.loads(response.choices[0].message.content)["translations"]
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        raise ValueError(f"Unparseable batch translation response: {e}")
+
+    if (not isinstance(translations, list) or len(translations) != len(texts)
+            or not all(isinstance(t, str) for t in translations)):
+        raise ValueError(f"Expected {len(texts)} translations, got {translations!r:.100}")
+
+    return [t.strip() for t in translations]
+
+def _translate_single(client: OpenAI, i: int, segment: Dict, target_language: str) -> Optional[str]:
+    try:
+        return translate_text(client, segment['text'], target_language)
+    except Exception as e:
+        print(f"Translation error for segment {i}: {e}")
+        return None
+
+def _translate_batch(client: OpenAI, batch: List[Tuple[int, Dict]], target_language: str) -> List[Optional[str]]:
+    try:
+        return translate_segments_batch(client, [segment for _, segment in batch], target_language)
+    except Exception as e:
+        print(f"Batch translation failed ({e}), translating {len(batch)} segments individually")
+        return [_translate_single(client, i, segment, target_language) for i, segment in batch]
+
+def iter_translated_batches(
+    segments: List[Dict],
+    target_language: str = "Spanish",
+    batch_size: int = TRANSLATION_BATCH_SIZE
+) -> Iterator[List[Dict]]:
+    """
+    Translate segments in place, yielding each group of segments as soon as its
+    'text_translated' is set, so a consumer can start synthesizing while later
+    batches are still being translated.
+    Previously translated texts are served from the disk cache (and yielded
+    first), repeated texts are translated once, up to TRANSLATION_CONCURRENCY
+    batches are in flight at once (yielded in completion order), and batches
+    whose response cannot be parsed fall back to one request per segment.
+    """
+    print(f"Translating {len(segments)} segments to {target_language} in batches of {batch_size}")
+
+    pending = []
+    cached_segments = []
     for i, segment in enumerate(segments):
-        try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": f"You are a professional translator. Translate the following text to {target_language}. "
-                                  f"Maintain the tone and style of the original. Keep the translation concise and natural. "
-                                  f"Do not add any explanations, just provide the translation."
-                    },
-                    {
-                        "role": "user",
-                        "content": segment['text']
-                    }
-                ],
-                temperature=0.3,
-                max_tokens=500
-            )
-            
-            segment['text_translated'] = response.choices[0].message.content.strip()
-            print(f"Segment {i+1}/{len(segments)}: {segment['text'][:30]}... -> {segment['text_translated'][:30]}...")
-            
-        except Exception as e:
-            print(f"Translation error for segment {i}: {e}")
-            segment['text_translated'] = segment['text']
-    
-    return segments
\ No newline at end of file
+        cached = get_cached_translation(segment['text'], target_language)
+        if cached is not None:
+            segment['text_translated'] = cached
+            cached_segments.append(segment)
+        else:
+            pending.append((i, segment))
+
+    if cached_segments:
+        print(f"Reused {len(cached_segments)} cached translations")
+        yield cached_segments
+
+    # Repeated lines ("yeah", "okay", ...) are translated once and shared
+    groups: Dict[str, List[Tuple[int, Dict]]] = {}
+    for i, segment in pending:
+        groups.setdefault(_dedupe_key(segment['text']), []).append((i, segment))
+
+    if len(groups) < len(pending):
+        print(f"Translating {len(groups)} unique texts for {len(pending)} segments")
+
+    client = _openai_client()
+
+    unique = [members[0] for members in groups.values()]
+    with ThreadPoolExecutor(max_workers=TRANSLATION_CONCURRENCY) as executor:
+        futures = {executor.submit(_translate_batch, client, batch, target_language): batch
+                   for batch in _batched(unique, batch_size)}
+
+        for future in as_completed(futures):
+            done = []
+            for (_, representative), translated in zip(futures[future], future.result()):
+                for i, segment in groups[_dedupe_key(representative['text'])]:
+                    if translated is None:
+                        segment['text_translated'] = segment['text']
+                    else:
+                        segment['text_translated'] = translated
+                        cache_translation(segment['text'], target_language, translated)
+                    print(f"Segment {i+1}/{len(segments)}: {segment['text'][:30]}... -> {segment['text_translated'][:30]}...")
+                    done.append(segment)
+
+            yield done
+
+def translate_segments(
+    segments: List[Dict],
+    target_language: str = "Spanish",
+    batch_size: int = TRANSLATION_BATCH_SIZE
+) -> List[Dict]:
+    """
+    Translate segments to target language using OpenAI, batch_size segments per request.
+    Preserves timing and speaker information.
+    """
+    for _ in iter_translated_batches(segments, target_language, batch_size):
+        pass
+
+    return segments
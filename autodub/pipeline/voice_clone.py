@@ -1,31 +1,31 @@
-import requests
+import os
 import subprocess
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Optional
-from ..config import ELEVENLABS_API_KEY, ELEVENLABS_BASE_URL
+import numpy as np
+from ._ffmpeg import extract_ranges
+from ._segments import segment_table, speaker_ids, speaker_rows, time_ranges
+from ._cache import (voice_sample_key, take_cached_voice, cache_voice, drop_cached_voice,
+                     cached_voice_ids, pop_expired_voices)
+from ..config import ELEVENLABS_API_KEY, ELEVENLABS_BASE_URL, HTTP_SESSION
 
-def extract_speaker_audio_for_cloning(segments: List[Dict], audio_path: Path, speaker_id: int) -> Optional[Path]:
-    """
-    Extract audio samples for a specific speaker for voice cloning.
-    Extracts up to 60 seconds of the cleanest audio.
-    """
-    
-    speaker_segments = [s for s in segments if s['speaker'] == speaker_id]
-    if not speaker_segments:
+def _extract_rows_for_cloning(rows: np.ndarray, audio_path: Path, speaker_id: int) -> Optional[Path]:
+    if not len(rows):
         return None
     
     # Sort by confidence and take best segments
-    speaker_segments.sort(key=lambda x: x.get('confidence', 0), reverse=True)
+    rows = rows[np.argsort(-rows['confidence'], kind='stable')]
+    durations = (rows['end'] - rows['start']).tolist()
     
     # Extract up to 60 seconds of audio
     total_duration = 0
-    selected_segments = []
+    selected = []
     
-    for segment in speaker_segments:
-        segment_duration = segment['end'] - segment['start']
+    for k, segment_duration in enumerate(durations):
         if total_duration + segment_duration <= 60:  # Max 60 seconds
-            selected_segments.append(segment)
+            selected.append(k)
             total_duration += segment_duration
         
         if total_duration >= 30:  # We have enough
@@ -37,70 +37,55 @@ def extract_speaker_audio_for_cloning(segments: List[Dict], audio_path: Path, sp
     
     print(f"  Extracting {total_duration:.1f}s for Speaker {speaker_id}")
     
-    # Create temporary files for segments
-    temp_files = []
+    output_path = Path(tempfile.mktemp(suffix=f'_speaker_{speaker_id}_clone.wav'))
     try:
-        for i, segment in enumerate(selected_segments):
-            temp_file = Path(tempfile.mktemp(suffix=f'_speaker_{speaker_id}_{i}.wav'))
-            temp_files.append(temp_file)
-            
-            # Extract segment
-            subprocess.run([
-                'ffmpeg', '-i', str(audio_path),
-                '-ss', str(segment['start']),
-                '-t', str(segment['end'] - segment['start']),
-                '-ar', '44100', '-ac', '1',  # 44.1kHz mono
-                '-y', str(temp_file)
-            ], capture_output=True, check=True)
-        
-        # Concatenate segments
-        output_path = Path(tempfile.mktemp(suffix=f'_speaker_{speaker_id}_clone.wav'))
-        
-        if len(temp_files) == 1:
-            # Single file, just copy
-            subprocess.run(['cp', str(temp_files[0]), str(output_path)], check=True)
-        else:
-            # Concatenate multiple files
-            input_list = '|'.join(str(f) for f in temp_files)
-            subprocess.run([
-                'ffmpeg', '-i', f'concat:{input_list}',
-                '-acodec', 'copy', '-y', str(output_path)
-            ], capture_output=True, check=True)
-        
+        extract_ranges(audio_path, time_ranges(rows[selected]), output_path, 44100)  # 44.1kHz mono
         return output_path
         
     except Exception as e:
         print(f"  Error extracting audio for Speaker {speaker_id}: {e}")
+        if output_path.exists():
+            output_path.unlink()
         return None
-    finally:
-        # Clean up temporary files
-        for temp_file in temp_files:
-            if temp_file.exists():
-                temp_file.unlink()
+
+def extract_speaker_audio_for_cloning(segments: List[Dict], audio_path: Path, speaker_id: int) -> Optional[Path]:
+    """
+    Extract audio samples for a specific speaker for voice cloning.
+    Extracts up to 60 seconds of the cleanest audio.
+    """
+    return _extract_rows_for_cloning(speaker_rows(segment_table(segments), speaker_id), audio_path, speaker_id)
+
+def _encode_upload_mp3(audio_path: Path) -> bytes:
+    """Encode audio to a small 16 kHz mono MP3 in memory (ffmpeg writes to stdout)."""
+    with open(audio_path, 'rb') as source:
+        result = subprocess.run([
+            'ffmpeg', '-nostdin', '-loglevel', 'error', '-nostats',
+            '-i', 'pipe:0',
+            '-ac', '1', '-ar', '16000', '-b:a', '32k',
+            '-f', 'mp3', 'pipe:1'
+        ], stdin=source, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    return result.stdout
 
 def clone_voice_elevenlabs(audio_path: Path, speaker_name: str) -> Optional[str]:
     """
     Clone a voice using ElevenLabs API.
+    The sample is uploaded as-is (ElevenLabs accepts WAV); only a sample over
+    the 10MB upload limit is re-encoded, to MP3 piped straight into the request.
     Returns voice_id if successful, None if failed.
     """
     try:
-        # Convert to MP3 if needed (ElevenLabs prefers MP3)
-        mp3_path = audio_path.with_suffix('.mp3')
-        if not mp3_path.exists():
-            subprocess.run([
-                'ffmpeg', '-i', str(audio_path),
-                '-acodec', 'libmp3lame', '-ar', '22050',
-                '-y', str(mp3_path)
-            ], capture_output=True, check=True)
-        else:
-            mp3_path = audio_path
+        file_size_mb = audio_path.stat().st_size / (1024 * 1024)
         
         # Check file size (ElevenLabs has 10MB limit)
-        file_size_mb = mp3_path.stat().st_size / (1024 * 1024)
         if file_size_mb > 10:
-            print(f"  Audio file too large ({file_size_mb:.1f}MB), cloning may fail")
+            print(f"  Audio file too large ({file_size_mb:.1f}MB), compressing to MP3")
+            upload = (f"{speaker_name}.mp3", _encode_upload_mp3(audio_path), "audio/mpeg")
+            file_size_mb = len(upload[1]) / (1024 * 1024)
+        else:
+            # requests builds multipart bodies in memory, so this costs no extra copy
+            upload = (audio_path.name, audio_path.read_bytes(), "audio/wav")
         
-        print(f"  Uploading {file_size_mb:.1f}MB audio sample...")
+        print(f"  Uploading {file_size_mb:.1f}MB audio sample for {speaker_name}...")
         
         # Prepare the request
         url = f"{ELEVENLABS_BASE_URL}/voices/add"
@@ -114,29 +99,24 @@ def clone_voice_elevenlabs(audio_path: Path, speaker_name: str) -> Optional[str]
             "description": f"Cloned voice for dubbing - {speaker_name}"
         }
         
-        with open(mp3_path, 'rb') as audio_file:
-            files = {
-                "files": audio_file
-            }
-            
-            response = requests.post(url, headers=headers, data=data, files=files, timeout=60)
+        files = {
+            "files": upload
+        }
+        
+        response = HTTP_SESSION.post(url, headers=headers, data=data, files=files, timeout=60)
         
         if response.status_code == 200:
             result = response.json()
             voice_id = result.get('voice_id')
-            print(f"  ✅ Voice cloned successfully: {voice_id}")
+            print(f"  ✅ {speaker_name} cloned successfully: {voice_id}")
             return voice_id
         else:
-            print(f"  ❌ Cloning failed: {response.status_code} - {response.text}")
+            print(f"  ❌ Cloning {speaker_name} failed: {response.status_code} - {response.text}")
             return None
             
     except Exception as e:
-        print(f"  ❌ Cloning error: {e}")
+        print(f"  ❌ Cloning error for {speaker_name}: {e}")
         return None
-    finally:
-        # Clean up temporary MP3
-        if mp3_path != audio_path and mp3_path.exists():
-            mp3_path.unlink()
 
 def delete_cloned_voice(voice_id: str) -> bool:
     """
@@ -146,13 +126,69 @@ def delete_cloned_voice(voice_id: str) -> bool:
         url = f"{ELEVENLABS_BASE_URL}/voices/{voice_id}"
         headers = {"xi-api-key": ELEVENLABS_API_KEY}
         
-        response = requests.delete(url, headers=headers)
+        response = HTTP_SESSION.delete(url, headers=headers)
         return response.status_code == 200
     except Exception as e:
         print(f"Failed to delete voice {voice_id}: {e}")
         return False
 
-def clone_speaker_voices(segments: List[Dict], audio_path: Path, use_cloning: bool = False) -> Dict[int, Optional[str]]:
+def voice_exists(voice_id: str) -> bool:
+    """
+    Check that a voice still exists on ElevenLabs (it may have been deleted in the dashboard).
+    """
+    try:
+        url = f"{ELEVENLABS_BASE_URL}/voices/{voice_id}"
+        headers = {"xi-api-key": ELEVENLABS_API_KEY}
+        
+        response = HTTP_SESSION.get(url, headers=headers, timeout=30)
+        return response.status_code == 200
+    except Exception as e:
+        print(f"Failed to look up voice {voice_id}: {e}")
+        return False
+
+def _clone_speaker(table: np.ndarray, audio_path: Path, speaker_id: int) -> Optional[str]:
+    """
+    Extract and clone one speaker's voice. Returns the voice_id, or None.
+    A voice already cloned from the identical sample (e.g. re-dubbing a video) is reused.
+    """
+    print(f"\n🎤 Processing Speaker {speaker_id}:")
+    
+    # Extract audio for this speaker
+    speaker_audio_path = _extract_rows_for_cloning(speaker_rows(table, speaker_id), audio_path, speaker_id)
+    
+    if speaker_audio_path is None:
+        print(f"  ⏭️  Skipping cloning for Speaker {speaker_id}")
+        return None
+    
+    try:
+        key = voice_sample_key(speaker_audio_path)
+        voice_id = take_cached_voice(key)
+        if voice_id is not None:
+            if voice_exists(voice_id):
+                print(f"  ♻️  Reusing cloned voice for Speaker {speaker_id}: {voice_id}")
+                return voice_id
+            # Gone or unreachable: forget it (deleting it in case it still exists) and clone afresh
+            print(f"  Cached voice {voice_id} for Speaker {speaker_id} is unavailable, cloning again")
+            drop_cached_voice(key)
+            delete_cloned_voice(voice_id)
+        
+        # Clone the voice
+        speaker_name = f"Speaker_{speaker_id}_Clone"
+        voice_id = clone_voice_elevenlabs(speaker_audio_path, speaker_name)
+        if voice_id is not None:
+            cache_voice(key, voice_id)
+        return voice_id
+    finally:
+        # Clean up temp audio file
+        if speaker_audio_path.exists():
+            speaker_audio_path.unlink()
+
+def clone_speaker_voices(
+    segments: List[Dict],
+    audio_path: Path,
+    use_cloning: bool = False,
+    table: Optional[np.ndarray] = None
+) -> Dict[int, Optional[str]]:
     """
     Main function to clone voices for all speakers.
     
@@ -160,6 +196,7 @@ def clone_speaker_voices(segments: List[Dict], audio_path: Path, use_cloning: bo
         segments: List of transcribed segments
         audio_path: Path to original audio file
         use_cloning: Whether to actually perform cloning
+        table: segment_table(segments), if the caller already built it
         
     Returns:
         Dictionary mapping speaker_id -> cloned_voice_id (or None if cloning failed)
@@ -170,31 +207,19 @@ def clone_speaker_voices(segments: List[Dict], audio_path: Path, use_cloning: bo
         return {}
     
     # Get unique speakers
-    speakers = set(segment['speaker'] for segment in segments)
-    cloned_voices = {}
+    if table is None:
+        table = segment_table(segments)
+    speakers = speaker_ids(table)
     
     print(f"Attempting to clone {len(speakers)} speaker(s)...")
     
-    for speaker_id in speakers:
-        print(f"\n🎤 Processing Speaker {speaker_id}:")
-        
-        # Extract audio for this speaker
-        speaker_audio_path = extract_speaker_audio_for_cloning(segments, audio_path, speaker_id)
-        
-        if speaker_audio_path is None:
-            print(f"  ⏭️  Skipping cloning for Speaker {speaker_id}")
-            cloned_voices[speaker_id] = None
-            continue
-        
-        # Clone the voice
-        speaker_name = f"Speaker_{speaker_id}_Clone"
-        voice_id = clone_voice_elevenlabs(speaker_audio_path, speaker_name)
-        
-        cloned_voices[speaker_id] = voice_id
-        
-        # Clean up temp audio file
-        if speaker_audio_path.exists():
-            speaker_audio_path.unlink()
+    if not speakers:
+        return {}
+    
+    # Speakers are independent, so extract and upload them concurrently
+    with ThreadPoolExecutor(max_workers=min(len(speakers), os.cpu_count() or 1)) as executor:
+        voice_ids = list(executor.map(lambda speaker_id: _clone_speaker(table, audio_path, speaker_id), speakers))
+    cloned_voices = dict(zip(speakers, voice_ids))
     
     successful_clones = sum(1 for v in cloned_voices.values() if v is not None)
     print(f"\n📊 Cloning Summary: {successful_clones}/{len(speakers)} voices cloned successfully")
@@ -204,8 +229,11 @@ def clone_speaker_voices(segments: List[Dict], audio_path: Path, use_cloning: bo
 def cleanup_cloned_voices(cloned_voices: Dict[int, Optional[str]]):
     """
     Clean up cloned voices from ElevenLabs after use.
+    Cached voices are kept for later jobs; those whose cache entry expired are deleted.
     """
-    voices_to_delete = [v for v in cloned_voices.values() if v is not None]
+    cached = cached_voice_ids()
+    voices_to_delete = [v for v in cloned_voices.values() if v is not None and v not in cached]
+    voices_to_delete += [v for v in pop_expired_voices() if v not in voices_to_delete]
     
     if not voices_to_delete:
         return
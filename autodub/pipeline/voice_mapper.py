@@ -1,5 +1,7 @@
-from typing import Dict, List
-import random
+from typing import Dict, Iterable, List, Optional
+import logging
+import numpy as np
+from scipy.optimize import linear_sum_assignment
 
 # Expanded voice pool with gender and characteristics
 VOICE_POOL = {
@@ -70,59 +72,62 @@ VOICE_POOL = {
     }
 }
 
-def score_voice_match(speaker_profile: Dict, voice_info: Dict) -> float:
+_ID_TO_NAME = {info['voice_id']: name for name, info in VOICE_POOL.items()}
+
+# The pool frozen as parallel tuples/arrays at import, so scoring never walks the dicts
+_GENDERS = ('male', 'female', 'neutral')
+_VOICE_NAMES = tuple(VOICE_POOL)
+_VOICE_IDS = tuple(info['voice_id'] for info in VOICE_POOL.values())
+_VOICE_GENDER = np.fromiter((_GENDERS.index(info['gender']) for info in VOICE_POOL.values()),
+                            dtype=np.int8, count=len(VOICE_POOL))
+
+# Voices are scored with a linear model: a speaker's features are
+# (1, pitch below 165Hz, pitch above 200Hz), and each gender's row weights them.
+# Male voices are strongly preferred, then neutral, then female.
+_GENDER_WEIGHTS = np.array([
+    (14.0, 4.0, 0.0),  # male: 15 base, +3 for low pitches and -1 otherwise
+    (2.0, 0.0, 4.0),   # female: 3 base, +3 for high pitches and -1 otherwise
+    (8.0, 0.0, 0.0),   # neutral
+])
+_VOICE_WEIGHTS = np.ascontiguousarray(_GENDER_WEIGHTS[_VOICE_GENDER].T)  # (features x voices)
+
+_RNG = np.random.default_rng()
+
+log = logging.getLogger(__name__)
+
+def _speaker_features(speaker_profiles: List[Dict]) -> np.ndarray:
+    mean_pitch = np.array([profile.get('mean_pitch', 150) for profile in speaker_profiles], dtype=float)
+    return np.column_stack([np.ones_like(mean_pitch), mean_pitch < 165, mean_pitch > 200])
+
+def score_voices_matrix(speaker_profiles: List[Dict]) -> np.ndarray:
     """
-    Score how well a voice matches a speaker profile.
-    Higher score = better match. Prefer male voices as default.
+    A (speakers x voices) matrix of how well every voice in VOICE_POOL (in
+    _VOICE_NAMES order) matches each profile, with a single matrix product.
+    Higher score = better match.
     """
-    score = 0.0
-    
-    # Prefer male voices (override gender detection)
-    if voice_info['gender'] == 'male':
-        score += 15.0  # Strong preference for male voices
-    elif voice_info['gender'] == 'neutral':
-        score += 8.0   # Neutral is second choice
-    else:
-        score += 3.0   # Female voices as fallback
-    
-    # Pitch-based matching
-    mean_pitch = speaker_profile.get('mean_pitch', 150)
-    if voice_info['gender'] == 'male':
-        # Male voices work better for lower pitches
-        if mean_pitch < 165:
-            score += 3.0
-        else:
-            score -= 1.0
-    elif voice_info['gender'] == 'female':
-        # Female voices work better for higher pitches  
-        if mean_pitch > 200:
-            score += 3.0
-        else:
-            score -= 1.0
+    scores = _speaker_features(speaker_profiles) @ _VOICE_WEIGHTS
     
-    # Prefer diverse tones
-    score += random.uniform(-0.5, 0.5)  # Small random factor for variety
-    
-    return score
+    # Small random factor for variety
+    return scores + _RNG.uniform(-0.5, 0.5, size=scores.shape)
 
-def assign_unique_voices(speaker_profiles: Dict[int, Dict], used_voices: List[str] = None) -> Dict[int, str]:
+def assign_unique_voices(speaker_profiles: Dict[int, Dict], used_voices: Optional[Iterable[str]] = None) -> Dict[int, str]:
     """
     Assign unique, appropriate voices to each speaker based on their profiles.
+    Voices are matched in one optimal assignment (Hungarian algorithm) that
+    maximizes the total match score, rather than greedily speaker by speaker.
+    If there are more speakers than voices, the main speakers get unique voices
+    and the rest are matched again, a pool's worth at a time, so the voices
+    they share are spread across the pool.
     
     Args:
         speaker_profiles: Dictionary mapping speaker_id -> characteristics
-        used_voices: List of voice IDs already assigned (for avoiding conflicts)
+        used_voices: VOICE_POOL names already assigned elsewhere (for avoiding conflicts)
         
     Returns:
         Dictionary mapping speaker_id -> voice_id
     """
-    print("Assigning voices to speakers...")
-    
-    if used_voices is None:
-        used_voices = []
-    
-    assignments = {}
-    available_voices = list(VOICE_POOL.keys())
+    used_voices = set(used_voices or ())
+    available = [k for k, name in enumerate(_VOICE_NAMES) if name not in used_voices]
     
     # Sort speakers by total speaking time (prioritize main speakers)
     speakers_by_duration = sorted(
@@ -131,46 +136,53 @@ def assign_unique_voices(speaker_profiles: Dict[int, Dict], used_voices: List[st
         reverse=True
     )
     
-    print(f"Speaker priority by duration: {[f'Speaker {sid}' for sid, _ in speakers_by_duration]}")
+    if not available:
+        print("Warning: every voice is already in use, all speakers get the default voice")
+    elif len(speakers_by_duration) > len(available):
+        print(f"Warning: {len(speakers_by_duration)} speakers but {len(available)} available voices, "
+              f"{len(speakers_by_duration) - len(available)} speaker(s) will share a voice")
+    
+    # (speakers x available voices) score matrix, solved for the best total. The
+    # main speakers are matched first; if there are more speakers than voices,
+    # each further round matches the next ones against the whole pool again.
+    best_voices = {}
+    shared = set()
+    if available and speakers_by_duration:
+        scores = score_voices_matrix([profile for _, profile in speakers_by_duration])[:, available]
+        for start in range(0, len(speakers_by_duration), len(available)):
+            rows, cols = linear_sum_assignment(scores[start:start + len(available)], maximize=True)
+            for row, col in zip(rows + start, cols):
+                speaker_id = speakers_by_duration[row][0]
+                best_voices[speaker_id] = (available[col], scores[row, col])
+                if start > 0:
+                    shared.add(speaker_id)
     
-    for speaker_id, profile in speakers_by_duration:
-        print(f"\nAssigning voice for Speaker {speaker_id}:")
-        print(f"  Profile: {profile['estimated_gender']} "
-              f"({profile['mean_pitch']:.1f}Hz, "
-              f"{profile['total_duration']:.1f}s total)")
-        
-        # Score all available voices
-        voice_scores = []
-        for voice_name in available_voices:
-            if voice_name not in used_voices:  # Skip already assigned voices
-                voice_info = VOICE_POOL[voice_name]
-                score = score_voice_match(profile, voice_info)
-                voice_scores.append((voice_name, voice_info, score))
-        
-        if not voice_scores:
-            # Fallback if no voices available (shouldn't happen with our pool size)
-            print(f"  Warning: No available voices, using default")
-            voice_id = '21m00Tcm4TlvDq8ikWAM'  # Rachel as fallback
+    assignments = {}
+    for speaker_id, _ in speakers_by_duration:
+        if speaker_id not in best_voices:
+            # Fallback if every voice is in used_voices
+            assignments[speaker_id] = '21m00Tcm4TlvDq8ikWAM'  # Rachel as fallback
         else:
-            # Pick the best matching voice
-            voice_scores.sort(key=lambda x: x[2], reverse=True)
-            best_voice_name, best_voice_info, best_score = voice_scores[0]
-            voice_id = best_voice_info['voice_id']
-            
-            print(f"  Best match: {best_voice_name} "
-                  f"({best_voice_info['gender']} {best_voice_info['tone']}, score: {best_score:.1f})")
-            
-            # Mark this voice as used
-            used_voices.append(best_voice_name)
-            if best_voice_name in available_voices:
-                available_voices.remove(best_voice_name)
-        
-        assignments[speaker_id] = voice_id
-    
-    print(f"\nFinal voice assignments:")
-    for speaker_id, voice_id in assignments.items():
-        voice_name = next((name for name, info in VOICE_POOL.items() if info['voice_id'] == voice_id), 'unknown')
-        print(f"  Speaker {speaker_id} -> {voice_name} ({voice_id})")
+            assignments[speaker_id] = _VOICE_IDS[best_voices[speaker_id][0]]
+    
+    # Per-speaker detail is only formatted when debug logging is on
+    if log.isEnabledFor(logging.DEBUG):
+        lines = ["Voice assignment by speaking time:"]
+        for speaker_id, profile in speakers_by_duration:
+            lines.append(f"  Speaker {speaker_id}: {profile['estimated_gender']} "
+                         f"({profile['mean_pitch']:.1f}Hz, {profile['total_duration']:.1f}s total)")
+            if speaker_id not in best_voices:
+                lines.append("    No available voices, using default")
+            else:
+                best, best_score = best_voices[speaker_id]
+                best_voice_info = VOICE_POOL[_VOICE_NAMES[best]]
+                lines.append(f"    {'Shared' if speaker_id in shared else 'Best'} match: {_VOICE_NAMES[best]} "
+                             f"({best_voice_info['gender']} {best_voice_info['tone']}, score: {best_score:.1f})")
+        log.debug("\n".join(lines))
+    
+    print("Voice assignments: " + ", ".join(
+        f"Speaker {speaker_id} -> {_ID_TO_NAME.get(voice_id, 'unknown')}" for speaker_id, voice_id in assignments.items()
+    ))
     
     return assignments
 
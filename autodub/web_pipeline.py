@@ -4,14 +4,17 @@ Web-optimized AutoDub pipeline with progress tracking
 Wrapper around main_enhanced.py that provides progress updates for web interface
 """
 
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional, Callable
 
-from .main_enhanced import LANGUAGE_MAP
-from .pipeline.download import download_video
+from .languages import resolve_language
+from .pipeline.download import start_download
 from .pipeline.separate import separate_audio
 from .pipeline.transcribe import transcribe_audio
 from .pipeline.speaker_profile import build_speaker_profiles
+from .pipeline._segments import segment_table, speaker_ids
 from .pipeline.voice_mapper import assign_unique_voices
 from .pipeline.voice_clone import clone_speaker_voices, cleanup_cloned_voices
 from .pipeline.translate import translate_segments
@@ -19,7 +22,9 @@ from .pipeline.synthesize_enhanced import synthesize_segments_enhanced, validate
 from .pipeline.align_simple import align_segments_simple
 from .pipeline.mix_simple import mix_audio_simple
 from .pipeline.mux import mux_video
-from .config import TEMP_DIR, OUTPUT_DIR
+from .config import TEMP_DIR, OUTPUT_DIR, DEFAULT_VOICE_ID
+
+log = logging.getLogger(__name__)
 
 def enhanced_autodub_pipeline_with_progress(
     youtube_url: str,
@@ -45,49 +50,68 @@ def enhanced_autodub_pipeline_with_progress(
     Returns:
         Path to the final dubbed video
     """
+    lang_name, lang_code = resolve_language(target_language)
+    
     def update_progress(step: int, message: str):
         if progress_callback:
             progress_callback(step, message)
-        print(f"[Step {step}/9] {message}")
+        else:
+            print(f"[Step {step}/9] {message}")
     
     try:
-        update_progress(1, "Downloading video and extracting audio...")
-        video_path, audio_path = download_video(youtube_url, output_name or "web_job")
-        
-        update_progress(2, "Transcribing with speaker diarization...")
-        segments = transcribe_audio(audio_path)
-        
-        if preserve_background:
-            update_progress(3, "Separating vocals from background...")
-            vocals_path, background_path = separate_audio(audio_path, use_separation=True)
-        else:
-            update_progress(3, "Skipping source separation...")
-            vocals_path = None
-            background_path = None
+        update_progress(1, "Downloading audio (video continues in background)...")
+        video_download, audio_path = start_download(youtube_url, output_name or "web_job")
+        
+        # Transcription overlaps with source separation running in a worker thread
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            if preserve_background:
+                separation = executor.submit(separate_audio, audio_path, use_separation=True)
+            else:
+                separation = None
+                vocals_path = None
+                background_path = None
+            
+            update_progress(2, "Transcribing with speaker diarization...")
+            segments = transcribe_audio(audio_path)
+            
+            if separation is not None:
+                update_progress(3, "Separating vocals from background...")
+                vocals_path, background_path = separation.result()
+            else:
+                update_progress(3, "Skipping source separation...")
         
         if not segments:
             raise Exception("No speech segments detected in the video")
         
         # Check speakers
-        unique_speakers = set(segment['speaker'] for segment in segments)
+        # Indexed by speaker once, for cloning and profiling to share
+        speaker_table = segment_table(segments)
+        unique_speakers = speaker_ids(speaker_table)
         update_progress(4, f"Detected {len(unique_speakers)} unique speaker(s)")
         
-        # Voice cloning
-        cloned_voices = {}
-        if voice_clone:
-            update_progress(4, "Cloning voices...")
-            cloned_voices = clone_speaker_voices(segments, audio_path, use_cloning=True)
+        # Speaker profiling (local analysis) overlaps with voice cloning (ElevenLabs uploads)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            profiling = None
+            if diverse_voices and len(unique_speakers) > 1:
+                profiling = executor.submit(build_speaker_profiles, segments,
+                                            vocals_path if preserve_background else audio_path, table=speaker_table)
+            
+            # Voice cloning
+            cloned_voices = {}
+            if voice_clone:
+                update_progress(4, "Cloning voices...")
+                cloned_voices = clone_speaker_voices(segments, audio_path, use_cloning=True, table=speaker_table)
+            
+            if profiling is not None:
+                update_progress(5, "Building speaker profiles...")
+                speaker_profiles = profiling.result()
         
         # Speaker analysis and voice assignment
-        if diverse_voices and len(unique_speakers) > 1:
-            update_progress(5, "Building speaker profiles...")
-            speaker_profiles = build_speaker_profiles(segments, vocals_path if preserve_background else audio_path)
-            
+        if profiling is not None:
             update_progress(5, "Assigning unique voices...")
             voice_assignments = assign_unique_voices(speaker_profiles)
         else:
             update_progress(5, "Using default voice assignment...")
-            from .config import DEFAULT_VOICE_ID
             voice_assignments = {}
             for speaker in unique_speakers:
                 voice_assignments[speaker] = DEFAULT_VOICE_ID
@@ -98,13 +122,12 @@ def enhanced_autodub_pipeline_with_progress(
             for speaker_id, cloned_voice_id in cloned_voices.items():
                 if cloned_voice_id is not None:
                     voice_assignments[speaker_id] = cloned_voice_id
-                    print(f"  Speaker {speaker_id} -> Using cloned voice ({cloned_voice_id[:12]}...)")
+                    log.debug("Speaker %s -> using cloned voice (%s...)", speaker_id, cloned_voice_id[:12])
         
         # Always validate final assignments
         validate_voice_assignments(voice_assignments)
         
         # Translation
-        lang_name, lang_code = LANGUAGE_MAP.get(target_language, (target_language, target_language))
         update_progress(6, f"Translating {len(segments)} segments to {lang_name}...")
         segments = translate_segments(segments, lang_name)
         
@@ -128,7 +151,7 @@ def enhanced_autodub_pipeline_with_progress(
             final_audio_path = dubbed_audio_path
         
         update_progress(9, "Creating final dubbed video...")
-        output_path = mux_video(video_path, final_audio_path, output_name or "web_output")
+        output_path = mux_video(video_download.result(), final_audio_path, output_name or "web_output")
         
         # Cleanup
         if cloned_voices:
@@ -5,50 +5,136 @@ Provides REST API wrapper around the enhanced autodub pipeline
 """
 
 import asyncio
-import uuid
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import secrets
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
 from datetime import datetime
+from email.utils import formatdate
 from pathlib import Path
-from typing import Dict, Optional, Any
+from typing import Dict, Optional, Any, Tuple
 import threading
 import traceback
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Form
+from fastapi import FastAPI, HTTPException, Form, Request, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from pydub import AudioSegment
 import uvicorn
 
-from autodub.main_enhanced import LANGUAGE_MAP
+from autodub.languages import LANGUAGE_MAP
 from autodub.web_pipeline import enhanced_autodub_pipeline_with_progress
 
-app = FastAPI(title="AutoDub API", version="1.0.0")
+# Pipelines run in worker processes so they never contend with the API for the GIL.
+# Jobs share TEMP_DIR file names, so by default they run one at a time.
+JOB_WORKERS = int(os.getenv("AUTODUB_JOB_WORKERS", "1"))
 
-# Job storage (in production, use Redis/database)
-jobs: Dict[str, Dict[str, Any]] = {}
+# Finished jobs are kept for a day, and at most MAX_JOBS are stored in total
+JOB_TTL_SECONDS = 24 * 3600
+MAX_JOBS = 1024
+
+UNSUPPORTED_LANGUAGE = f"Unsupported language. Available: {list(LANGUAGE_MAP.keys())}"
+
+JOB_STREAM_INTERVAL = 0.5  # Seconds between checks for job changes on /jobs/{id}/stream
+
+log = logging.getLogger(__name__)
+
+def load_index_html() -> Optional[Dict[str, Any]]:
+    """Read the frontend once, with the validators browsers revalidate it by."""
+    html_path = Path("web_static/index.html")
+    if not html_path.exists():
+        return None
+    content = html_path.read_bytes()
+    return {
+        "content": content,
+        "headers": {
+            "ETag": f'"{hashlib.sha1(content).hexdigest()}"',
+            "Last-Modified": formatdate(html_path.stat().st_mtime, usegmt=True),
+            "Cache-Control": "no-cache",
+        },
+    }
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.index_html = load_index_html()
+    
+    # Job storage (in production, use Redis/database), shared with the workers
+    manager = multiprocessing.Manager()
+    app.state.jobs = manager.dict()
+    app.state.pool = ProcessPoolExecutor(max_workers=JOB_WORKERS)
+    try:
+        yield
+    finally:
+        app.state.pool.shutdown(wait=False, cancel_futures=True)
+        manager.shutdown()
+
+app = FastAPI(title="AutoDub API", version="1.0.0", lifespan=lifespan)
+
+# A worker that dies (e.g. OOM in Demucs) breaks its whole pool, which is then replaced
+_pool_lock = threading.Lock()
+
+def replace_broken_pool(broken: ProcessPoolExecutor):
+    with _pool_lock:
+        if app.state.pool is broken:
+            print("Job worker pool broke, starting a new one")
+            app.state.pool = ProcessPoolExecutor(max_workers=JOB_WORKERS)
+    broken.shutdown(wait=False)
+
+def submit_job(*args) -> Tuple[ProcessPoolExecutor, Future]:
+    """Submit run_autodub_pipeline to the worker pool, replacing the pool first if it is broken."""
+    pool = app.state.pool
+    try:
+        return pool, pool.submit(run_autodub_pipeline, *args)
+    except BrokenProcessPool:
+        replace_broken_pool(pool)
+        pool = app.state.pool
+        return pool, pool.submit(run_autodub_pipeline, *args)
+
+def update_job(jobs, job_id: str, **fields):
+    # Manager dict values are copies, so write the whole job back.
+    # Each job has one writer at a time (its worker, then check_worker), so this doesn't race.
+    jobs[job_id] = {**jobs[job_id], **fields}
+
+def evict_jobs(jobs):
+    """
+    Drop finished jobs older than JOB_TTL_SECONDS, then the oldest finished
+    jobs until fewer than MAX_JOBS remain. Queued and running jobs are never
+    evicted, since their workers still update them.
+    """
+    finished = sorted(
+        (job["completed_at"], job_id) for job_id, job in jobs.copy().items()
+        if job["status"] in ("completed", "failed")
+    )
+    cutoff = datetime.now().timestamp() - JOB_TTL_SECONDS
+    excess = len(jobs) - MAX_JOBS + 1
+    for k, (completed_at, job_id) in enumerate(finished):
+        if k >= excess and datetime.fromisoformat(completed_at).timestamp() >= cutoff:
+            break
+        jobs.pop(job_id, None)
 
 # Background task runner
 def run_autodub_pipeline(
+    jobs,
     job_id: str,
     youtube_url: str,
     language: str,
     voice_clone: bool,
     preserve_background: bool
 ):
-    """Run the autodub pipeline in background thread"""
+    """Run the autodub pipeline in a worker process"""
     try:
         # Update job status
-        jobs[job_id]["status"] = "processing"
-        jobs[job_id]["started_at"] = datetime.now().isoformat()
+        update_job(jobs, job_id, status="processing", started_at=datetime.now().isoformat())
         
         # Progress callback function
         def update_progress(step: int, message: str):
-            jobs[job_id].update({
-                "progress": step,
-                "total_steps": 9,
-                "current_step": message,
-                "status": "processing"
-            })
-            print(f"[{job_id}] Step {step}/9: {message}")
+            update_job(jobs, job_id, progress=step, total_steps=9, current_step=message, status="processing")
+            log.debug("[%s] Step %d/9: %s", job_id, step, message)
         
         # Run the pipeline with progress tracking
         output_path = enhanced_autodub_pipeline_with_progress(
@@ -62,30 +148,32 @@ def run_autodub_pipeline(
         )
         
         # Success
-        jobs[job_id].update({
-            "status": "completed",
-            "completed_at": datetime.now().isoformat(),
-            "output_path": str(output_path),
-            "output_url": f"/outputs/{output_path.name}",
-            "progress": 9,
-            "current_step": "✅ Completed successfully!"
-        })
+        update_job(
+            jobs, job_id,
+            status="completed",
+            completed_at=datetime.now().isoformat(),
+            output_path=str(output_path),
+            output_url=f"/outputs/{output_path.name}",
+            progress=9,
+            current_step="✅ Completed successfully!"
+        )
         
     except Exception as e:
         # Error handling
-        error_msg = str(e)
         traceback.print_exc()
-        
-        jobs[job_id].update({
-            "status": "failed",
-            "completed_at": datetime.now().isoformat(),
-            "error": error_msg,
-            "current_step": f"❌ Failed: {error_msg}"
-        })
+        mark_job_failed(jobs, job_id, str(e))
+
+def mark_job_failed(jobs, job_id: str, error_msg: str):
+    update_job(
+        jobs, job_id,
+        status="failed",
+        completed_at=datetime.now().isoformat(),
+        error=error_msg,
+        current_step=f"❌ Failed: {error_msg}"
+    )
 
 @app.post("/dub")
 async def create_dub_job(
-    background_tasks: BackgroundTasks,
     youtube_url: str = Form(...),
     language: str = Form("es"),
     voice_clone: bool = Form(True),
@@ -98,14 +186,16 @@ async def create_dub_job(
         raise HTTPException(status_code=400, detail="YouTube URL is required")
     
     if language not in LANGUAGE_MAP:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Unsupported language. Available: {list(LANGUAGE_MAP.keys())}"
-        )
+        raise HTTPException(status_code=400, detail=UNSUPPORTED_LANGUAGE)
     
     # Create job
-    job_id = str(uuid.uuid4())[:8]  # Short ID
+    jobs = app.state.jobs
+    evict_jobs(jobs)
     
+    # 72 random bits (12 URL-safe characters), redrawn in the unlikely event of a clash
+    job_id = secrets.token_urlsafe(9)
+    while job_id in jobs:
+        job_id = secrets.token_urlsafe(9)
     jobs[job_id] = {
         "job_id": job_id,
         "youtube_url": youtube_url,
@@ -120,29 +210,64 @@ async def create_dub_job(
     }
     
     # Start background task
-    background_tasks.add_task(
-        run_autodub_pipeline,
-        job_id,
-        youtube_url,
-        language,
-        voice_clone,
-        preserve_background
-    )
+    try:
+        pool, future = submit_job(jobs, job_id, youtube_url, language, voice_clone, preserve_background)
+    except Exception as e:
+        mark_job_failed(jobs, job_id, f"Could not start job: {e}")
+        raise HTTPException(status_code=503, detail="Could not start job, try again")
+    
+    # run_autodub_pipeline records its own errors; this catches a worker that died
+    def check_worker(future: Future):
+        if future.cancelled() or future.exception() is None:
+            return
+        mark_job_failed(jobs, job_id, f"Worker process failed: {future.exception()}")
+        if isinstance(future.exception(), BrokenProcessPool):
+            replace_broken_pool(pool)
+    future.add_done_callback(check_worker)
     
     return {"job_id": job_id}
 
 @app.get("/jobs/{job_id}")
 async def get_job_status(job_id: str):
     """Get job status and progress"""
+    job = app.state.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return job
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job_status(job_id: str):
+    """
+    Stream job status as Server-Sent Events: one event whenever the job
+    changes, ending once it completes or fails.
+    """
+    jobs = app.state.jobs
     if job_id not in jobs:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    return jobs[job_id]
+    # Workers update the job from other processes, so changes are picked up
+    # here on the server side rather than by every client polling. Each read is
+    # a round trip to the manager process, so it runs off the event loop.
+    async def events():
+        last = None
+        while True:
+            job = await asyncio.to_thread(jobs.get, job_id)
+            if job is None:
+                break
+            if job != last:
+                yield f"data: {json.dumps(job)}\n\n"
+                last = job
+            if job["status"] in ("completed", "failed"):
+                break
+            await asyncio.sleep(JOB_STREAM_INTERVAL)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 @app.get("/jobs")
 async def list_jobs():
     """List all jobs (for debugging)"""
-    return {"jobs": jobs}
+    return {"jobs": app.state.jobs.copy()}
 
 # Serve output files
 output_dir = Path("outputs")
@@ -155,11 +280,13 @@ static_dir.mkdir(exist_ok=True)
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
 @app.get("/", response_class=HTMLResponse)
-async def root():
-    """Serve the main HTML interface"""
-    html_path = Path("web_static/index.html")
-    if html_path.exists():
-        return FileResponse(html_path)
+async def root(request: Request):
+    """Serve the main HTML interface (read once at startup)"""
+    index_html = app.state.index_html
+    if index_html is not None:
+        if request.headers.get("if-none-match") == index_html["headers"]["ETag"]:
+            return Response(status_code=304, headers=index_html["headers"])
+        return HTMLResponse(content=index_html["content"], headers=index_html["headers"])
     else:
         # Return basic HTML if no file exists yet
         return HTMLResponse("""